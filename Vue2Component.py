@@ -1,4 +1,23 @@
+import json
+import sys
+import zlib
+
+# Bumped whenever a field is added, removed or changes meaning, so stale stored scans are rejected instead of misread
+IR_VERSION = 2
+BINARY_MAGIC = b'V2IR'
+# Values up to this length (prop types, initial data values, getter names) repeat across components and are interned
+INTERN_MAX_LENGTH = 48
+
+# Field order of the compact forms; the dict and JSON forms use the names
+FIELDS = ('name', 'components', 'props', 'data', 'computed', 'mixins', 'methods', 'watch', 'lifecycle_hooks',
+          'imports', 'uses_vuex', 'has_setup_content', 'script_attrs', 'mixin_sources', 'mixin_members')
+
+
+# Result of scanning a Vue2 component: plain strings, lists and insertion-ordered dicts only, so it round-trips
+# through JSON and the binary form unchanged and the generator gives the same output for a loaded scan.
 class Vue2Component:
+    __slots__ = FIELDS
+
     def __init__(self):
         self.name = ""
         self.components = {}
@@ -9,6 +28,92 @@ class Vue2Component:
         self.methods = {}
         self.watch = {}
         self.lifecycle_hooks = {}
-        self.imports = set()
+        # Import statements in source order, without duplicates
+        self.imports = []
         self.uses_vuex = False
         self.has_setup_content = False
+        # Attributes of the original <script> tag, e.g. ' lang="ts"', carried over to the generated one
+        self.script_attrs = ""
+        # Module each mixin was default-imported from, e.g. {'FormMixin': './mixins/form'}
+        self.mixin_sources = {}
+        # Instance members inherited from mixins, mapped to the mixin providing them; filled in by MixinIndex
+        self.mixin_members = {}
+
+    def __eq__(self, other):
+        if not isinstance(other, Vue2Component):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __repr__(self):
+        return f"Vue2Component({self.name!r})"
+
+    def compact(self):
+        # Share identical names and short values between components instead of keeping a copy per scan
+        for field in FIELDS:
+            value = getattr(self, field)
+            if isinstance(value, (dict, list, str)):
+                setattr(self, field, _intern(value))
+        return self
+
+    def add_import(self, statement):
+        if statement not in self.imports:
+            self.imports.append(statement)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    @classmethod
+    def from_dict(cls, values):
+        component = cls()
+        for field in FIELDS:
+            if field in values:
+                setattr(component, field, values[field])
+        return component.compact()
+
+    def to_tuple(self):
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    @classmethod
+    def from_tuple(cls, values):
+        if len(values) != len(FIELDS):
+            raise ValueError(f"Expected {len(FIELDS)} component fields, got {len(values)}")
+        component = cls()
+        for field, value in zip(FIELDS, values):
+            setattr(component, field, value)
+        return component.compact()
+
+    def to_json(self, indent=None):
+        return json.dumps({'version': IR_VERSION, 'component': self.to_dict()}, indent=indent)
+
+    @classmethod
+    def from_json(cls, text):
+        document = json.loads(text)
+        _check_version(document.get('version'))
+        return cls.from_dict(document['component'])
+
+    def to_bytes(self):
+        # Magic, version byte, then the fields by position as minimal JSON, deflated; field names are not repeated
+        payload = json.dumps(self.to_tuple(), separators=(',', ':')).encode()
+        return BINARY_MAGIC + bytes([IR_VERSION]) + zlib.compress(payload)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError("Not a serialized Vue2Component")
+        _check_version(data[len(BINARY_MAGIC)])
+        return cls.from_tuple(json.loads(zlib.decompress(data[len(BINARY_MAGIC) + 1:])))
+
+
+def _check_version(version):
+    if version != IR_VERSION:
+        raise ValueError(f"Unsupported Vue2Component format version {version}, expected {IR_VERSION}")
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value) if len(value) <= INTERN_MAX_LENGTH else value
+    if isinstance(value, dict):
+        return {sys.intern(key) if isinstance(key, str) else key: _intern(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_intern(item) for item in value]
+    return value
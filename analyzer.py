@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from discovery import FileCosts, find_components, schedule
+from js_parsers import ParseError
+from main import configure_logging, read_file
+from parser import Vue2Scanner
+from prefilter import skip_reason
+from sfc import find_block, find_script_block, split_sfc
+from template import TemplateRewriter
+
+logger = logging.getLogger(__name__)
+
+# How much each occurrence of a feature adds to a file's migration score
+WEIGHTS = {
+    'parse_error': 10,
+    'unsupported_nodes': 5,
+    'mixins': 3,
+    '$root': 2,
+    'instance_apis': 1,
+    'mapGetters': 1,
+    '$nextTick': 1,
+    'watch_immediate': 1,
+    'watch_deep': 1,
+    'template_rewrites': 1,
+}
+
+INSTANCE_API_RE = re.compile(r'\bthis\.\$(\w+)')
+UNSUPPORTED_RE = re.compile(r'/\* Unsupported node type: (\w+) \*/')
+IMMEDIATE_RE = re.compile(r'\bimmediate\s*:\s*true\b')
+DEEP_RE = re.compile(r'\bdeep\s*:\s*true\b')
+
+
+def analyze_content(content, options=None):
+    # Scan only: the features are read off the scanned component and the script text, nothing is generated
+    options = options or {}
+    features = dict.fromkeys(WEIGHTS, 0)
+    apis = Counter()
+    unsupported = Counter()
+
+    blocks = split_sfc(content)
+    template_block = find_block(blocks, 'template')
+    if template_block is not None:
+        rewriter = TemplateRewriter(template_block.content)
+        rewriter.rewrite()
+        features['template_rewrites'] = rewriter.changes
+
+    script_block = find_script_block(blocks)
+    # Scripts the converter would leave alone are not parsed here either
+    skipped = None
+    if script_block is not None and options.get('prefilter', True):
+        skipped = skip_reason(script_block.content)
+    if script_block is not None and skipped is None:
+        script = script_block.content
+        apis.update(INSTANCE_API_RE.findall(script))
+        features['$root'] = apis.pop('root', 0)
+        features['$nextTick'] = apis.pop('nextTick', 0)
+        features['instance_apis'] = sum(apis.values())
+        try:
+            component = Vue2Scanner('', parser=options.get('parser', 'auto')).scan_script(script)
+        except (ParseError, RecursionError):
+            # RecursionError: nested deeper than the parser's recursion goes
+            features['parse_error'] = 1
+        else:
+            features['mapGetters'] = int(component.uses_vuex)
+            features['mixins'] = len(component.mixins)
+            watchers = '\n'.join(component.watch.values())
+            features['watch_immediate'] = len(IMMEDIATE_RE.findall(watchers))
+            features['watch_deep'] = len(DEEP_RE.findall(watchers))
+            bodies = [*component.methods.values(), *component.computed.values(), *component.watch.values(),
+                      *component.lifecycle_hooks.values(), *map(str, component.data.values())]
+            unsupported.update(UNSUPPORTED_RE.findall('\n'.join(bodies)))
+            features['unsupported_nodes'] = sum(unsupported.values())
+
+    score = sum(WEIGHTS[name] * value for name, value in features.items())
+    return {'score': score, 'features': features, 'instance_apis': dict(apis),
+            'unsupported_nodes': dict(unsupported), 'skipped': skipped}
+
+
+def analyze_file(src_path, options=None):
+    # A file that cannot be read or analyzed gets a record with only its error, instead of ending the whole analysis
+    try:
+        record = analyze_content(read_file(src_path), options)
+    except (OSError, UnicodeError) as e:
+        return {'path': src_path, 'error': f"Cannot read {src_path}: {e}"}
+    except Exception as e:
+        return {'path': src_path, 'error': f"Cannot analyze {src_path}: {e}"}
+    record['path'] = src_path
+    return record
+
+
+def _init_analyzer(log_level):
+    # Analysis only scans, so unlike conversion workers these do not load the generator or jsbeautifier
+    configure_logging(log_level)
+
+
+# Runs the scan-only analysis over a file or a tree and aggregates the per-file records into a report
+class CodebaseAnalyzer:
+    def __init__(self, src_root, workers=None, log_level=logging.INFO, options=None, include=None, exclude=None):
+        self.src_root = src_root
+        self.include = include
+        self.exclude = exclude
+        self.workers = workers or os.cpu_count() or 1
+        self.log_level = log_level
+        self.options = options
+        self.max_pending = self.workers * 4
+        self.files = []
+        self.features = {name: {'files': 0, 'total': 0} for name in WEIGHTS}
+        self.instance_apis = Counter()
+        self.unsupported_nodes = Counter()
+        self.skipped = Counter()
+        self.failed = []
+
+    def add(self, record):
+        if 'error' in record:
+            self.failed.append(record)
+            return
+        self.files.append({'path': record['path'], 'score': record['score'], 'features': record['features']})
+        for name, value in record['features'].items():
+            if value:
+                self.features[name]['files'] += 1
+                self.features[name]['total'] += value
+        self.instance_apis.update(record['instance_apis'])
+        self.unsupported_nodes.update(record['unsupported_nodes'])
+        if record['skipped']:
+            self.skipped[record['skipped']] += 1
+
+    def run(self):
+        if not os.path.isdir(self.src_root):
+            self.add(analyze_file(self.src_root, self.options))
+            return self.report()
+
+        # future -> path of the file it analyzes
+        pending = {}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_analyzer,
+                                 initargs=(self.log_level,)) as executor:
+            paths = find_components(self.src_root, self.include, self.exclude)
+            for src_path in schedule(paths, FileCosts(self.src_root)):
+                if len(pending) >= self.max_pending:
+                    for future in wait(pending, return_when=FIRST_COMPLETED)[0]:
+                        self._collect(future, pending.pop(future))
+                pending[executor.submit(analyze_file, src_path, self.options)] = src_path
+            for future in wait(pending)[0]:
+                self._collect(future, pending[future])
+        return self.report()
+
+    def _collect(self, future, src_path):
+        try:
+            record = future.result()
+        except Exception as e:
+            # The worker itself failed, e.g. it died or the record could not be sent back
+            record = {'path': src_path, 'error': f"Cannot analyze {src_path}: {e}"}
+        self.add(record)
+
+    def report(self):
+        return {
+            'files': len(self.files),
+            'score': sum(record['score'] for record in self.files),
+            'features': self.features,
+            'instance_apis': dict(self.instance_apis.most_common()),
+            'unsupported_nodes': dict(self.unsupported_nodes.most_common()),
+            'skipped': dict(self.skipped.most_common()),
+            'failed': sorted(self.failed, key=lambda record: record['path']),
+            'weights': WEIGHTS,
+            'scores': sorted(self.files, key=lambda record: record['score'], reverse=True),
+        }
+
+    def write_report(self, path):
+        start = time.perf_counter()
+        report = self.run()
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+        logger.info("Analyzed %d files in %.2fs, total migration score %d", report['files'],
+                    time.perf_counter() - start, report['score'])
+        for name, counts in report['features'].items():
+            if counts['files']:
+                logger.info("  %-18s %6d files %8d occurrences", name, counts['files'], counts['total'])
+        if report['unsupported_nodes']:
+            logger.info("  unsupported nodes: %s", ', '.join(f"{name} ({count})" for name, count in
+                                                          report['unsupported_nodes'].items()))
+        for reason, count in report['skipped'].items():
+            logger.info("  %d scripts need no conversion: %s", count, reason)
+        for record in report['failed']:
+            logger.error("FAILED: %s", record['error'])
+        logger.info("Report written to %s", path)
+        return report
@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import profiling
+from cache import ConversionCache
+from discovery import DEFAULT_LOOKAHEAD, FileCosts, find_components, schedule
+from main import configure_logging, convert_sfc, read_file, warm_up, write_file
+from manifest import Manifest
+
+logger = logging.getLogger(__name__)
+
+
+_worker_cache = None
+_worker_budget = None
+
+
+# Collects the warnings logged while one file is converted, for its manifest entry
+class _WarningCollector(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _init_worker(log_level, cache_dir, cache_size, profile_memory=None, budget=None, options=None):
+    global _worker_cache, _worker_budget
+
+    # Spawned workers start without the parent's logging setup
+    configure_logging(log_level)
+
+    # Load the parser backend, the converter and jsbeautifier (when the run beautifies) while the worker starts, with
+    # the options of the run, so the first file's time and budget only cover converting it
+    warm_up(options or {})
+
+    if cache_dir:
+        _worker_cache = ConversionCache(cache_dir, max_bytes=cache_size)
+
+    # Time limits applied to every file this worker converts
+    _worker_budget = budget
+
+    # None leaves profiling off; otherwise it says whether allocations are traced as well
+    if profile_memory is not None:
+        profiling.Profiler(track_memory=profile_memory).activate()
+
+
+def read_input(src_path):
+    # The stat is taken before reading, so an edit made meanwhile shows up as a changed input on resume
+    stat = os.stat(src_path)
+    return stat, read_file(src_path)
+
+
+def write_output(dst_path, output):
+    os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+    write_file(dst_path, output)
+
+
+def manifest_entry(content, stat, start, warnings):
+    return {'sha256': hashlib.sha256(content.encode()).hexdigest(), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns, 'seconds': round(time.perf_counter() - start, 6), 'warnings': warnings}
+
+
+def convert_content(src_path, content, options=None):
+    # The CPU-bound part of converting a file, without any file I/O
+    warnings = _WarningCollector()
+    logging.getLogger().addHandler(warnings)
+    try:
+        hits = _worker_cache.hits if _worker_cache else 0
+        status, output, error = convert_sfc(content, options=options, cache=_worker_cache, path=src_path,
+                                            budget=_worker_budget)
+        cache_hit = _worker_cache is not None and _worker_cache.hits > hits
+    finally:
+        logging.getLogger().removeHandler(warnings)
+    return status, output, error, cache_hit, warnings.messages
+
+
+def convert_text(src_path, content, options=None):
+    # Worker task of the asyncio pipeline, where the parent process does the reading and writing
+    profiler = profiling.active()
+    if profiler is not None:
+        profiler.start_file(src_path)
+    result = convert_content(src_path, content, options)
+    record = profiler.end_file() if profiler is not None else None
+    return (*result, record)
+
+
+def convert_file(src_path, dst_path, options=None):
+    profiler = profiling.active()
+    if profiler is not None:
+        profiler.start_file(src_path)
+
+    start = time.perf_counter()
+    try:
+        with profiling.phase('read'):
+            stat, content = read_input(src_path)
+    except (OSError, UnicodeError) as e:
+        # An unreadable or undecodable file fails on its own instead of aborting the whole run
+        record = profiler.end_file() if profiler is not None else None
+        return src_path, 'failed', f"Cannot read {src_path}: {e}", False, record, None
+    status, output, error, cache_hit, warnings = convert_content(src_path, content, options)
+    try:
+        with profiling.phase('write'):
+            write_output(dst_path, output)
+    except (OSError, UnicodeError) as e:
+        status, error = 'failed', f"Cannot write {dst_path}: {e}"
+
+    record = profiler.end_file() if profiler is not None else None
+    return src_path, status, error, cache_hit, record, manifest_entry(content, stat, start, warnings)
+
+
+class BatchConverter:
+    def __init__(self, src_root, dst_root, workers=None, log_level=logging.INFO, cache_dir=None, cache_size=None,
+                 options=None, profile=None, profile_memory=False, in_process=False, manifest=None, resume=False,
+                 include=None, exclude=None, costs=None, lookahead=DEFAULT_LOOKAHEAD, budget=None):
+        self.src_root = src_root
+        self.dst_root = dst_root
+        self.workers = workers or os.cpu_count() or 1
+        self.log_level = log_level
+        self.options = options
+        self.cache = ConversionCache(cache_dir, max_bytes=cache_size) if cache_dir else None
+        # Keep a few tasks queued per worker so nobody idles, without submitting the whole tree at once
+        self.max_pending = self.workers * 4
+        self.results = {'converted': 0, 'skipped': 0, 'failed': 0}
+        self.failures = []
+        self.skip_reasons = Counter()
+        # Path of the JSON phase report; the per-file records come back from the workers
+        self.profile = profile
+        self.profile_memory = profile_memory
+        self.profiler = profiling.Profiler() if profile else None
+        # Convert in this process instead of a pool, so a surrounding cProfile run sees the conversions
+        self.in_process = in_process
+        # Path of the JSONL manifest, and whether to skip the files an earlier run with it completed
+        self.manifest_path = manifest
+        self.resume = resume
+        self.manifest = None
+        self.resumed = 0
+        # Glob patterns selecting the files to convert, and how they are ordered: largest first within a window of
+        # lookahead files, by their time in the costs manifest of an earlier run or else by size
+        self.include = include
+        self.exclude = exclude
+        self.costs = costs
+        self.lookahead = lookahead
+        self.file_costs = None
+        # Budget each file is converted within, see budget.Budget
+        self.budget = budget
+
+    def _output_path(self, src_path):
+        return os.path.join(self.dst_root, os.path.relpath(src_path, self.src_root))
+
+    def _sources(self):
+        paths = find_components(self.src_root, self.include, self.exclude)
+        for src_path in schedule(paths, self.file_costs, self.lookahead):
+            if self.manifest is not None and self.manifest.is_done(os.path.relpath(src_path, self.src_root),
+                                                                     src_path, self._output_path(src_path)):
+                self.resumed += 1
+                continue
+            yield src_path
+
+    def run(self):
+        start = time.perf_counter()
+
+        cache_args = (self.cache.directory, self.cache.max_bytes) if self.cache else (None, None)
+        init_args = (self.log_level, *cache_args, self.profile_memory if self.profile else None, self.budget,
+                     self.options)
+        # Read before the manifest is opened: without --costs the timings come from the manifest this run replaces
+        self.file_costs = FileCosts(self.src_root, self.costs or self.manifest_path)
+        if self.manifest_path:
+            self.manifest = Manifest(self.manifest_path, resume=self.resume)
+        try:
+            if self.in_process:
+                self._run_in_process(init_args)
+            else:
+                self._run_pool(init_args)
+        finally:
+            if self.manifest is not None:
+                self.manifest.close()
+
+        elapsed = time.perf_counter() - start
+        total = sum(self.results.values())
+        workers = "in-process" if self.in_process else f"with {self.workers} workers"
+        logger.info("Processed %d files in %.2fs %s: %d converted, %d skipped, %d failed",
+                    total, elapsed, workers, self.results['converted'], self.results['skipped'],
+                    self.results['failed'])
+        for reason, count in self.skip_reasons.most_common():
+            logger.info("  skipped %d: %s", count, reason)
+        if self.resumed:
+            logger.info("%d files were already done by an earlier run", self.resumed)
+        for src_path, error in self.failures:
+            logger.error("FAILED: %s: %s", src_path, error)
+
+        if self.cache is not None:
+            evicted = self.cache.evict()
+            logger.info("Cache: %d hits, %d misses, %d entries evicted", self.cache.hits, self.cache.misses, evicted)
+
+        if self.profiler is not None:
+            report = self.profiler.write_report(self.profile)
+            logger.info("Profile report written to %s, %d files, %.2fs in conversion phases",
+                        self.profile, report['files'], report['seconds'])
+
+        return self.results
+
+    def _run_pool(self, init_args):
+        pending = set()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=init_args) as executor:
+            for src_path in self._sources():
+                if len(pending) >= self.max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+                pending.add(executor.submit(convert_file, src_path, self._output_path(src_path), self.options))
+
+            done, _ = wait(pending)
+            self._collect(done)
+
+    def _run_in_process(self, init_args):
+        _init_worker(*init_args)
+        try:
+            for src_path in self._sources():
+                self._record(convert_file(src_path, self._output_path(src_path), self.options))
+        finally:
+            if profiling.active() is not None:
+                profiling.active().deactivate()
+
+    def _collect(self, futures):
+        for future in futures:
+            self._record(future.result())
+
+    def _record(self, result):
+        src_path, status, error, cache_hit, profile_record, entry = result
+        self.results[status] += 1
+        if self.manifest is not None:
+            # Appended only once the output has been written, so every entry stands for a finished file
+            self.manifest.append({'path': os.path.relpath(src_path, self.src_root), 'status': status,
+                                  'error': error if status == 'failed' else None,
+                                  'reason': error if status == 'skipped' else None, 'cache_hit': cache_hit,
+                                  **(entry or {})})
+        if self.cache is not None and status == 'converted':
+            # Workers keep their own counters, so tally the run-wide totals here
+            if cache_hit:
+                self.cache.hits += 1
+            else:
+                self.cache.misses += 1
+        if status == 'failed':
+            self.failures.append((src_path, error))
+        elif status == 'skipped':
+            self.skip_reasons[error] += 1
+        if self.profiler is not None and profile_record is not None:
+            self.profiler.add(profile_record)
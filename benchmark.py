@@ -0,0 +1,466 @@
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from js_parsers import BACKENDS, ParserUnavailable, get_parser
+from parser import Vue2Scanner, key_name
+from generator import Vue3Generator, pad_braces, split_function
+from serializer import NodeSerializer
+from sfc import find_script_block, split_sfc
+
+# Component shapes per size class: how many of each option to emit and how deeply method bodies nest
+SIZE_CLASSES = {
+    'small': {'props': 2, 'data': 3, 'computed': 2, 'methods': 3, 'watchers': 1, 'mixins': 0, 'getters': 1,
+              'depth': 1, 'statements': 2},
+    'medium': {'props': 8, 'data': 12, 'computed': 8, 'methods': 12, 'watchers': 4, 'mixins': 2, 'getters': 4,
+               'depth': 2, 'statements': 4},
+    'large': {'props': 25, 'data': 40, 'computed': 25, 'methods': 40, 'watchers': 12, 'mixins': 4, 'getters': 12,
+              'depth': 3, 'statements': 5},
+    'xlarge': {'props': 60, 'data': 120, 'computed': 60, 'methods': 80, 'watchers': 30, 'mixins': 8, 'getters': 30,
+               'depth': 4, 'statements': 6},
+}
+
+# Inputs of about the given size on which the regular expressions these steps replaced backtracked quadratically:
+# step name -> (function, input builder). Each step should scale linearly with the size.
+WORST_CASES = {
+    # An arrow function with an expression body and many ') {' inside, so no ')' ends the parameters
+    'method_body': (split_function, lambda size: "(a, b) => a.map((c, d) => { "
+                    + "if (c) { d(); } " * (size // 16) + "}).filter(Boolean)"),
+    # Many ')' that could end the parameters before the one that does
+    'method_params': (split_function, lambda size: "(" + "a) || (" * (size // 7) + "b) { return a; }"),
+    # A prop default full of '{' without a '}' after them
+    'prop_braces': (pad_braces, lambda size: "pattern: '" + "{" * size),
+}
+
+# Short invocations timed by --import-time, as arguments to python. {component} is a small Vue2 component and
+# {migrated} one with nothing to migrate, both written to a temporary directory; {output} is where results go.
+IMPORT_CASES = {
+    'help': ['main.py', '--help'],
+    'skip': ['main.py', '{migrated}', '{output}', '-q'],
+    'convert': ['main.py', '{component}', '{output}', '-q'],
+    'convert-no-beautify': ['main.py', '{component}', '{output}', '-q', '--no-beautify'],
+}
+
+# Dependencies that are slow to import, reported as loaded or not for every invocation
+HEAVY_MODULES = ('esprima', 'jsbeautifier')
+
+MIGRATED_COMPONENT = """<script>
+import { defineComponent } from 'vue';
+
+export default defineComponent({
+  setup() {
+    return {};
+  }
+});
+</script>
+"""
+
+PROP_TYPES = ['String', 'Number', 'Boolean', 'Array', 'Object']
+INDENT = "  "
+
+
+# Builds Vue2 Options API components of a given shape. The same seed always gives the same component, so benchmark
+# runs on different machines or commits measure identical inputs.
+class ComponentFactory:
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def component(self, name, props=2, data=3, computed=2, methods=3, watchers=1, mixins=0, getters=1, depth=1,
+                  statements=2):
+        self.props = [f"prop{i}" for i in range(props)]
+        self.data = [f"item{i}" for i in range(data)]
+        self.computed = [f"derived{i}" for i in range(computed)]
+        self.methods = [f"action{i}" for i in range(methods)]
+        self.getters = [f"getter{i}" for i in range(getters)]
+        self.depth = depth
+        self.statements = statements
+        # Numbers the declared constants, so no block declares the same name twice
+        self.declarations = 0
+
+        lines = ["<template>", f"{INDENT}<div class=\"{name.lower()}\">{{{{ item0 }}}}</div>", "</template>", "",
+                 "<script>"]
+        if getters:
+            lines.append("import { mapGetters } from 'vuex';")
+        mixin_names = [f"Mixin{i}" for i in range(mixins)]
+        for mixin in mixin_names:
+            lines.append(f"import {mixin} from './mixins/{mixin}';")
+        lines.append("")
+        lines.append("export default {")
+
+        options = [f"{INDENT}name: '{name}'"]
+        if mixin_names:
+            options.append(f"{INDENT}mixins: [{', '.join(mixin_names)}]")
+        if self.props:
+            options.append(self._block('props', [self._prop(prop) for prop in self.props]))
+        if self.data:
+            entries = [f"{INDENT * 3}{key}: {self._value()}" for key in self.data]
+            options.append(f"{INDENT}data() {{\n{INDENT * 2}return {{\n" + ",\n".join(entries)
+                           + f"\n{INDENT * 2}}};\n{INDENT}}}")
+        if self.computed or self.getters:
+            entries = []
+            if self.getters:
+                quoted = ', '.join(f"'{getter}'" for getter in self.getters)
+                entries.append(f"{INDENT * 2}...mapGetters([{quoted}])")
+            entries.extend(self._computed(key) for key in self.computed)
+            options.append(self._block('computed', entries))
+        if self.methods:
+            options.append(self._block('methods', [self._method(method) for method in self.methods]))
+        if watchers:
+            watched = self.random.sample(self.data, min(watchers, len(self.data)))
+            options.append(self._block('watch', [self._watcher(key) for key in watched]))
+        options.append(f"{INDENT}created() {{\n{self._body(2, 1)}\n{INDENT}}}")
+        options.append(f"{INDENT}mounted() {{\n{INDENT * 2}this.$nextTick(() => {{\n{self._body(3, 1)}\n"
+                       f"{INDENT * 2}}});\n{INDENT}}}")
+
+        lines.append(",\n".join(options))
+        lines.append("};")
+        lines.append("</script>")
+        lines.append("")
+        lines.append("<style scoped>")
+        lines.append(f".{name.lower()} {{ display: block; }}")
+        lines.append("</style>")
+        return "\n".join(lines) + "\n"
+
+    def _block(self, key, entries):
+        return f"{INDENT}{key}: {{\n" + ",\n".join(entries) + f"\n{INDENT}}}"
+
+    def _prop(self, prop):
+        prop_type = self.random.choice(PROP_TYPES)
+        if prop_type in ('Array', 'Object'):
+            default = "() => []" if prop_type == 'Array' else "() => ({})"
+            option = f"default: {default}"
+        else:
+            option = "required: true"
+        return f"{INDENT * 2}{prop}: {{\n{INDENT * 3}type: {prop_type},\n{INDENT * 3}{option}\n{INDENT * 2}}}"
+
+    def _value(self):
+        return self.random.choice(["0", "''", "null", "false", "[]", "{}", "'idle'", "42"])
+
+    def _computed(self, key):
+        left = self._reference()
+        right = self._reference()
+        return f"{INDENT * 2}{key}() {{\n{INDENT * 3}return {left} + {right};\n{INDENT * 2}}}"
+
+    def _method(self, name):
+        prefix = "async " if self.random.random() < 0.3 else ""
+        params = ", ".join(f"arg{i}" for i in range(self.random.randint(0, 2)))
+        return f"{INDENT * 2}{prefix}{name}({params}) {{\n{self._body(3, self.depth)}\n{INDENT * 2}}}"
+
+    def _watcher(self, key):
+        if self.random.random() < 0.5:
+            return f"{INDENT * 2}{key}(value, previous) {{\n{self._body(3, 1)}\n{INDENT * 2}}}"
+        return (f"{INDENT * 2}{key}: {{\n{INDENT * 3}handler: '{self.random.choice(self.methods or ['noop'])}',\n"
+                f"{INDENT * 3}immediate: true\n{INDENT * 2}}}")
+
+    def _reference(self):
+        pools = [pool for pool in (self.props, self.data, self.computed) if pool]
+        return f"this.{self.random.choice(self.random.choice(pools))}"
+
+    def _statement(self, level, depth):
+        pad = INDENT * level
+        choice = self.random.random()
+        if depth > 1 and choice < 0.25:
+            # Nested blocks stay short, so the size grows with depth without exploding
+            return (f"{pad}if ({self._reference()} > {self.random.randint(0, 9)}) {{\n"
+                    f"{self._body(level + 1, depth - 1, 2)}\n"
+                    f"{pad}}} else {{\n{self._body(level + 1, depth - 1, 2)}\n{pad}}}")
+        if depth > 1 and choice < 0.4:
+            return (f"{pad}for (let i = 0; i < {self._reference()}.length; i++) {{\n"
+                    f"{self._body(level + 1, depth - 1, 2)}\n{pad}}}")
+        if choice < 0.55 and self.data:
+            return f"{pad}this.{self.random.choice(self.data)} = {self._reference()};"
+        if choice < 0.7 and self.methods:
+            return f"{pad}this.{self.random.choice(self.methods)}({self._reference()});"
+        if choice < 0.8:
+            return f"{pad}this.$emit('changed', {self._reference()});"
+        if choice < 0.9:
+            self.declarations += 1
+            return f"{pad}const value{self.declarations} = {self._reference()} ? {self._reference()} : {self._value()};"
+        return f"{pad}console.log('step', {self._reference()});"
+
+    def _body(self, level, depth, statements=None):
+        return "\n".join(self._statement(level, depth) for _ in range(statements or self.statements))
+
+
+def generate_corpus(size_class, count, seed=0):
+    shape = SIZE_CLASSES[size_class]
+    return [ComponentFactory(seed + index).component(f"{size_class.capitalize()}{index}", **shape)
+            for index in range(count)]
+
+
+def _measure(function, repeat):
+    # Best wall time over the repeats, and the peak memory of a separate traced run so tracing does not skew timings
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def _timing(seconds, peak, count, size):
+    return {'seconds': seconds, 'components_per_second': count / seconds, 'bytes_per_second': size / seconds,
+            'peak_bytes': peak}
+
+
+def benchmark(size_classes, count=10, repeat=3, seed=0, options=None, parsers=()):
+    options = options or {}
+    results = {}
+    for size_class in size_classes:
+        corpus = generate_corpus(size_class, count, seed)
+        size = sum(len(content) for content in corpus)
+        result = {'components': count, 'bytes': size}
+
+        # Parsing alone with each backend, on the same scripts
+        scripts = [find_script_block(split_sfc(content)).content for content in corpus]
+        for name in parsers:
+            parser = get_parser(name)
+            seconds, peak, _ = _measure(lambda: [parser.parse(script) for script in scripts], repeat)
+            result[f'parse:{name}'] = _timing(seconds, peak, count, size)
+
+        slice_source = options.get('slice_source', False)
+        parser = options.get('parser', 'auto')
+        scan_time, scan_peak, components = _measure(
+            lambda: [Vue2Scanner(content, slice_source=slice_source, parser=parser).scan() for content in corpus],
+            repeat)
+        generate_time, generate_peak, _ = _measure(
+            lambda: [Vue3Generator(component, **options).generate() for component in components], repeat)
+
+        result['scan'] = _timing(scan_time, scan_peak, count, size)
+        result['generate'] = _timing(generate_time, generate_peak, count, size)
+        results[size_class] = result
+    return results
+
+
+def _method_nodes(parsed):
+    # The value nodes of the methods option of the component's export default
+    for node in parsed.body:
+        if node.type == 'ExportDefaultDeclaration' and node.declaration.type == 'ObjectExpression':
+            for option in node.declaration.properties:
+                if key_name(option.key) == 'methods' and option.value.type == 'ObjectExpression':
+                    yield from (method.value for method in option.value.properties)
+
+
+def _count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(getattr(item, 'type', None), str):
+            count += 1
+            stack.extend(value for value in vars(item).values() if isinstance(value, list) or hasattr(value, '__dict__'))
+    return count
+
+
+def serializer_benchmark(size_classes, count=10, repeat=3, seed=0, parser='auto'):
+    # NodeSerializer alone on the methods of each size class, parsed once beforehand, in AST nodes per second
+    serializer = NodeSerializer()
+    results = {}
+    for size_class in size_classes:
+        methods = []
+        for content in generate_corpus(size_class, count, seed):
+            parsed = get_parser(parser).parse(find_script_block(split_sfc(content)).content)
+            methods.extend(_method_nodes(parsed))
+        nodes = sum(_count_nodes(method) for method in methods)
+        seconds, peak, _ = _measure(lambda: [serializer.serialize(method) for method in methods], repeat)
+        results[size_class] = {'methods': len(methods), 'nodes': nodes, 'seconds': seconds,
+                               'nodes_per_second': nodes / seconds, 'peak_bytes': peak}
+    return results
+
+
+def print_serializer(results):
+    print(f"{'size':<8} {'methods':>8} {'nodes':>9} {'ms':>9} {'nodes/s':>11} {'peak KB':>9}")
+    for size_class, result in results.items():
+        print(f"{size_class:<8} {result['methods']:>8} {result['nodes']:>9} {result['seconds'] * 1000:>9.2f} "
+              f"{result['nodes_per_second']:>11.0f} {result['peak_bytes'] / 1024:>9.1f}")
+
+
+def worst_case(sizes, repeat=3):
+    results = {}
+    for name, (function, build) in WORST_CASES.items():
+        for size in sizes:
+            source = build(size)
+            seconds, _, _ = _measure(lambda: function(source), repeat)
+            results.setdefault(name, {})[len(source)] = seconds
+    return results
+
+
+def print_worst_case(results):
+    print(f"{'step':<16} {'KB':>8} {'ms':>9} {'MB/s':>9}")
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            print(f"{name:<16} {size / 1024:>8.1f} {seconds * 1000:>9.3f} {size / seconds / 1024 ** 2:>9.1f}")
+
+
+def _import_times(stderr):
+    # Module -> (self, cumulative) microseconds from the `import time:` lines python -X importtime writes to stderr.
+    # Top-level imports are the ones not indented below another module.
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split(' | ', 2)
+        modules[name.rstrip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def import_time(cases=None, repeat=3, python=None):
+    # Each case is run as its own process with -X importtime; the best total import time and wall time are reported
+    # with the slowest top-level imports of that run
+    cases = cases or list(IMPORT_CASES)
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {'component': os.path.join(directory, 'Component.vue'),
+                 'migrated': os.path.join(directory, 'Migrated.vue'),
+                 'output': os.path.join(directory, 'Output.vue')}
+        with open(paths['component'], 'w') as file:
+            file.write(generate_corpus('small', 1)[0])
+        with open(paths['migrated'], 'w') as file:
+            file.write(MIGRATED_COMPONENT)
+
+        for case in cases:
+            command = [python or sys.executable, '-X', 'importtime',
+                       *(argument.format(**paths) for argument in IMPORT_CASES[case])]
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                process = subprocess.run(command, cwd=root, capture_output=True, text=True)
+                wall = time.perf_counter() - start
+                if process.returncode != 0:
+                    raise RuntimeError(f"{' '.join(command)} exited with {process.returncode}")
+                modules = _import_times(process.stderr)
+                top_level = {name: cumulative for name, (_, cumulative) in modules.items() if not name.startswith(' ')}
+                run = {'wall_seconds': wall, 'import_seconds': sum(top_level.values()) / 1e6,
+                       'slowest': sorted(top_level.items(), key=lambda item: -item[1])[:5],
+                       'heavy': [name for name in HEAVY_MODULES if any(module.strip() == name for module in modules)]}
+                if best is None or run['import_seconds'] < best['import_seconds']:
+                    best = run
+            results[case] = best
+    return results
+
+
+def print_import_time(results):
+    print(f"{'invocation':<20} {'wall ms':>9} {'import ms':>10}  heavy modules loaded")
+    for case, result in results.items():
+        print(f"{case:<20} {result['wall_seconds'] * 1000:>9.1f} {result['import_seconds'] * 1000:>10.1f}  "
+              f"{', '.join(result['heavy']) or '-'}")
+        print("    " + ", ".join(f"{name} {microseconds / 1000:.1f}ms" for name, microseconds in result['slowest']))
+
+
+def print_results(results):
+    print(f"{'size':<8} {'phase':<13} {'files':>6} {'KB':>8} {'ms/file':>9} {'files/s':>9} {'KB/s':>9} "
+          f"{'peak KB':>9}")
+    for size_class, result in results.items():
+        for phase, timing in result.items():
+            if not isinstance(timing, dict):
+                continue
+            print(f"{size_class:<8} {phase:<13} {result['components']:>6} {result['bytes'] / 1024:>8.1f} "
+                  f"{timing['seconds'] * 1000 / result['components']:>9.2f} {timing['components_per_second']:>9.1f} "
+                  f"{timing['bytes_per_second'] / 1024:>9.1f} {timing['peak_bytes'] / 1024:>9.1f}")
+
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark scanning and generation on synthetic Vue2 components")
+    arg_parser.add_argument("--sizes", nargs="+", choices=list(SIZE_CLASSES), default=list(SIZE_CLASSES),
+                            help="Size classes to run (default: all)")
+    arg_parser.add_argument("-n", "--count", type=int, default=10, help="Components per size class (default: 10)")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=3,
+                            help="Timed repetitions, the best one is reported (default: 3)")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator (default: 0)")
+    arg_parser.add_argument("--no-beautify", dest="beautify", action="store_false",
+                            help="Benchmark the code builder instead of jsbeautifier")
+    arg_parser.add_argument("--slice-source", action="store_true",
+                            help="Benchmark copying bodies from the source instead of serializing the syntax tree")
+    arg_parser.add_argument("--parser", choices=['auto', *BACKENDS], default='auto',
+                            help="Parser used for the scan phase (default: auto)")
+    arg_parser.add_argument("--compare-parsers", nargs="+", choices=list(BACKENDS), default=[], metavar="PARSER",
+                            help="Also time parsing alone with each of these backends")
+    arg_parser.add_argument("--worst-case", nargs="*", type=int, default=None, metavar="BYTES",
+                            help="Instead time the text rewriting steps on inputs built to make them backtrack, at "
+                                 "these sizes (default: 10000 100000 1000000)")
+    arg_parser.add_argument("--serializer", action="store_true",
+                            help="Instead time NodeSerializer alone on the methods of each size class and report AST "
+                                 "nodes per second")
+    arg_parser.add_argument("--import-time", nargs="*", choices=list(IMPORT_CASES), default=None, metavar="CASE",
+                            help="Instead time the imports of short main.py invocations with python -X importtime: "
+                                 f"{', '.join(IMPORT_CASES)} (default: all)")
+    arg_parser.add_argument("--json", metavar="PATH", default=None, help="Also write the results as JSON")
+    arg_parser.add_argument("--write-corpus", metavar="DIR", default=None,
+                            help="Write the generated components as .vue files, e.g. as input for batch runs")
+    return arg_parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The converter's own logging would dominate the timings
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.write_corpus:
+        for size_class in args.sizes:
+            directory = os.path.join(args.write_corpus, size_class)
+            os.makedirs(directory, exist_ok=True)
+            for index, content in enumerate(generate_corpus(size_class, args.count, args.seed)):
+                with open(os.path.join(directory, f"{size_class.capitalize()}{index}.vue"), 'w') as file:
+                    file.write(content)
+        print(f"Corpus written to {args.write_corpus}")
+        return
+
+    if args.worst_case is not None:
+        results = worst_case(args.worst_case or [10_000, 100_000, 1_000_000], repeat=args.repeat)
+        print_worst_case(results)
+        if args.json:
+            with open(args.json, 'w') as file:
+                json.dump(results, file, indent=2)
+        return
+
+    if args.serializer:
+        try:
+            results = serializer_benchmark(args.sizes, count=args.count, repeat=args.repeat, seed=args.seed,
+                                           parser=args.parser)
+        except ParserUnavailable as e:
+            raise SystemExit(str(e))
+        print_serializer(results)
+        if args.json:
+            with open(args.json, 'w') as file:
+                json.dump(results, file, indent=2)
+        return
+
+    if args.import_time is not None:
+        results = import_time(args.import_time, repeat=args.repeat)
+        print_import_time(results)
+        if args.json:
+            with open(args.json, 'w') as file:
+                json.dump(results, file, indent=2)
+        return
+
+    try:
+        results = benchmark(args.sizes, count=args.count, repeat=args.repeat, seed=args.seed,
+                            options={'beautify': args.beautify, 'slice_source': args.slice_source,
+                                     'parser': args.parser},
+                            parsers=args.compare_parsers)
+    except ParserUnavailable as e:
+        raise SystemExit(str(e))
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
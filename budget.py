@@ -0,0 +1,91 @@
+import logging
+import signal
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# The budget whose timers are running, if any. paused() stops its clock, which costs one global lookup while no budget
+# is armed.
+_armed = None
+_NOT_ARMED = nullcontext()
+
+
+def paused():
+    # Work done for every file alike rather than for the one being converted, such as reading the conversion cache or
+    # indexing a shared mixin file the next components reuse, is not charged to the file that happens to need it first
+    if _armed is None:
+        return _NOT_ARMED
+    return _armed.pause()
+
+
+# Raised when a conversion runs out of its budget. A BaseException, like KeyboardInterrupt, so the broad
+# `except Exception` handlers of the conversion steps pass it on instead of carrying on with a half-scanned component.
+class BudgetExceeded(BaseException):
+    pass
+
+
+# Limits the wall-clock and CPU time of the block it guards. Interval timers deliver a signal once the time is up, and
+# the handler raises BudgetExceeded in the middle of whatever is running, a regular expression match included. Only
+# works in the main thread of a process (conversion workers run their tasks there) and on platforms with setitimer;
+# elsewhere the block runs unlimited.
+class Budget:
+    def __init__(self, seconds=None, cpu_seconds=None):
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self._handlers = None
+
+    def __bool__(self):
+        return bool(self.seconds or self.cpu_seconds)
+
+    def _timers(self):
+        return [(signal.ITIMER_REAL, signal.SIGALRM, self.seconds, 'time'),
+                (signal.ITIMER_PROF, signal.SIGPROF, self.cpu_seconds, 'CPU time')]
+
+    def __enter__(self):
+        global _armed
+        if not self or not hasattr(signal, 'setitimer'):
+            return self
+        if threading.current_thread() is not threading.main_thread():
+            logger.debug("Time budgets only apply in the main thread, converting without one")
+            return self
+
+        self._handlers = {}
+        for timer, signum, limit, kind in self._timers():
+            if limit:
+                self._handlers[signum] = signal.signal(signum, self._expired(kind, limit))
+                signal.setitimer(timer, limit)
+        _armed = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _armed
+        if self._handlers is None:
+            return False
+        _armed = None
+        # Disarm before restoring the handlers, so a timer that fires just now cannot reach the previous handler
+        for timer, signum, _, _ in self._timers():
+            if signum in self._handlers:
+                signal.setitimer(timer, 0)
+        for signum, handler in self._handlers.items():
+            signal.signal(signum, handler)
+        self._handlers = None
+        return False
+
+    @contextmanager
+    def pause(self):
+        # Stops the armed timers and restarts them afterwards with the time they had left
+        remaining = {timer: signal.setitimer(timer, 0)[0] for timer, signum, _, _ in self._timers()
+                     if signum in self._handlers}
+        try:
+            yield
+        finally:
+            for timer, seconds in remaining.items():
+                if seconds:
+                    signal.setitimer(timer, seconds)
+
+    @staticmethod
+    def _expired(kind, limit):
+        def handler(signum, frame):
+            raise BudgetExceeded(f"Exceeded the {kind} budget of {limit:g}s")
+        return handler
@@ -0,0 +1,546 @@
+import re
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>[ \t\r\f]+)
+  | (?P<newline>\n)
+  | (?P<comment>//[^\n]*|/\*[\s\S]*?\*/)
+  | (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<template>`)
+  | (?P<word>[A-Za-z_$\u0080-￿][\w$\u0080-￿]*|\d[\w.]*|\.\d\w*)
+  | (?P<punct>\.\.\.|=>|===|!==|\*\*=|>>>=|<<=|>>=|>>>|\?\?=|&&=|\|\|=|\?\.(?!\d)|==|!=|<=|>=|&&|\|\||\?\?
+             |\+\+|--|\+=|-=|\*=|/=|%=|&=|\|=|\^=|\*\*|<<|>>|[{}()\[\];,<>+\-*/%&|^!~?:=.@\#])
+  | (?P<other>.)
+""", re.VERBOSE)
+REGEX_BODY_RE = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+
+# Tokens after which a '/' starts a regular expression literal rather than a division
+REGEX_PRECEDERS = {'(', ',', '=', ':', '[', '!', '&', '|', '?', '{', '}', ';', '&&', '||', '??', '=>', 'return',
+                   'typeof', 'case', 'throw', 'in', 'of', 'delete', 'void'}
+# Keywords that keep a space before a following '('
+SPACED_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'return', 'typeof', 'await', 'in', 'of', 'new', 'async',
+                   'delete', 'void', 'throw', 'instanceof', 'yield', 'case', 'do', 'else', 'const', 'let', 'var',
+                   'with', 'extends'}
+# Keywords after which an expression (and so a unary operator or an object literal) starts
+EXPRESSION_KEYWORDS = {'return', 'typeof', 'case', 'throw', 'in', 'of', 'new', 'delete', 'void', 'await', 'yield',
+                       'instanceof', 'else', 'do'}
+CONTROL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'with'}
+CONTINUATION_KEYWORDS = {'else', 'catch', 'finally'}
+TIGHT_OPERATORS = {'.', '?.'}
+UNARY_OPERATORS = {'!', '~', '-', '+', '...'}
+
+
+class _Frame:
+    __slots__ = ('kind', 'level', 'opener', 'ternaries', 'wrapped', 'embedded')
+
+    def __init__(self, kind, level, opener=None, embedded=0):
+        # kind is one of 'block', 'object', 'case', 'paren' or 'bracket'
+        self.kind = kind
+        self.level = level
+        self.opener = opener
+        # Number of enclosing blocks that sit inside an expression, see CodeBuilder._wrap
+        self.embedded = embedded
+        self.ternaries = 0
+        self.wrapped = False
+
+
+def tokenize(code):
+    tokens = []
+    newlines = 0
+    prev = None
+    pos = 0
+    end = len(code)
+    while pos < end:
+        if code[pos] == '/' and prev in REGEX_PRECEDERS and not code.startswith(('//', '/*'), pos):
+            match = REGEX_BODY_RE.match(code, pos)
+            if match:
+                tokens.append(('string', match.group(), newlines))
+                newlines = 0
+                prev = 'regex'
+                pos = match.end()
+                continue
+
+        match = TOKEN_RE.match(code, pos)
+        kind = match.lastgroup
+        text = match.group()
+        pos = match.end()
+
+        if kind == 'space':
+            continue
+        if kind == 'newline':
+            newlines += 1
+            continue
+        if kind == 'template':
+            template_end = _scan_template(code, pos)
+            text = code[pos - 1:template_end]
+            pos = template_end
+            kind = 'string'
+        elif kind == 'other':
+            kind = 'word'
+
+        tokens.append((kind, text, newlines))
+        newlines = 0
+        if kind != 'comment':
+            prev = text
+    return tokens
+
+
+def _scan_template(code, pos):
+    # Find the end of a template literal starting right after its opening backtick, skipping over ${...}
+    # substitutions that may themselves contain braces, strings and nested templates
+    end = len(code)
+    while pos < end:
+        char = code[pos]
+        if char == '\\':
+            pos += 2
+        elif char == '`':
+            return pos + 1
+        elif char == '$' and code.startswith('${', pos):
+            depth = 1
+            pos += 2
+            while pos < end and depth:
+                char = code[pos]
+                if char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+                elif char in '\'"':
+                    match = TOKEN_RE.match(code, pos)
+                    pos = match.end() - 1 if match.lastgroup == 'string' else pos
+                elif char == '`':
+                    pos = _scan_template(code, pos + 1) - 1
+                pos += 1
+        else:
+            pos += 1
+    return end
+
+
+# Lays out JavaScript the way jsbeautifier does for the code the generator emits (collapsed braces, expanded
+# object literals, one statement per line), but in a single pass over the tokens and with statements terminated
+# as they are emitted, so no beautify round-trip or semicolon patching is needed afterwards.
+class CodeBuilder:
+    def __init__(self, indent="    ", wrap_line_length=149):
+        self.indent = indent
+        self.wrap_line_length = wrap_line_length
+        self.lines = []
+        self._pieces = []
+        self._level = 0
+        self._length = 0
+        self._wrap_point = None
+
+    def line(self, level, text=""):
+        # Append a line that is already laid out
+        self._flush()
+        if text:
+            self.lines.append(self.indent * level + text)
+        else:
+            self.lines.append("")
+
+    def blank(self):
+        self.line(0)
+
+    def code(self, level, code, embedded=0):
+        # Lay out a snippet of serialized JavaScript, starting at the given indentation level. embedded is the
+        # number of enclosing blocks that are part of an expression, e.g. 1 for statements inside setup() {...}
+        self._flush()
+        self._start_line(level)
+        _Layout(self, level, tokenize(code), embedded).run()
+        self._flush()
+
+    def getvalue(self):
+        self._flush()
+        return "\n".join(self.lines)
+
+    def _start_line(self, level):
+        self._flush()
+        self._level = level
+        self._length = len(self.indent) * level
+        self._wrap_point = None
+
+    def _flush(self):
+        if self._pieces:
+            self.lines.append(self.indent * self._level + "".join(self._pieces))
+            self._pieces = []
+
+    def _last_piece(self):
+        return self._pieces[-1] if self._pieces else None
+
+    def _push(self, text, space, continuation_level, embedded=0, wrap_point=None):
+        if wrap_point is None:
+            wrap_point = space
+        if self._pieces and wrap_point:
+            # Like jsbeautifier, a wrapped line may only break where a space would have been printed, or before a '.'
+            self._wrap_point = (len(self._pieces), self._length, continuation_level)
+        if space and self._pieces:
+            self._pieces.append(" ")
+            self._length += 1
+        self._pieces.append(text)
+        self._length += len(text)
+        return self._wrap(embedded)
+
+    def _wrap(self, embedded):
+        # jsbeautifier measures lines inside blocks that belong to an expression (an arrow function body, setup()
+        # itself) with one extra indent each, and only removes that indent after deciding where to wrap.
+        # Counting the same way keeps long lines breaking at the same places.
+        length = self._length + len(self.indent) * embedded
+        if not self.wrap_line_length or length <= self.wrap_line_length or self._wrap_point is None:
+            return False
+        index, length, level = self._wrap_point
+        if length <= len(self.indent) * level:
+            return False
+
+        head, tail = self._pieces[:index], self._pieces[index:]
+        self.lines.append(self.indent * self._level + "".join(head))
+        moved = self._length - length
+        if tail[0] == " ":
+            tail.pop(0)
+            moved -= 1
+        self._pieces = tail
+        self._level = level
+        self._length = len(self.indent) * level + moved
+        self._wrap_point = None
+        return True
+
+
+class _Layout:
+    def __init__(self, builder, level, tokens, embedded=0):
+        self.builder = builder
+        self.tokens = tokens
+        self.frames = [_Frame('block', level, embedded=embedded)]
+        self.prev_kind = None
+        self.prev = None
+        # Whether the last '}' closed an object literal rather than a block
+        self.closed_object = False
+
+    def run(self):
+        tokens = self.tokens
+        for index, (kind, text, newlines) in enumerate(tokens):
+            if kind == 'punct' and text in '{}()[];,:?' and len(text) == 1:
+                handler = getattr(self, '_' + {'{': 'open_brace', '}': 'close_brace', '(': 'open_paren',
+                                               ')': 'close_paren', '[': 'open_bracket', ']': 'close_bracket',
+                                               ';': 'semicolon', ',': 'comma', ':': 'colon', '?': 'question'}[text])
+                handler(text, newlines, index)
+            elif kind == 'punct':
+                self._operator(text, newlines, index)
+            elif kind == 'comment':
+                self._comment(text, newlines)
+            else:
+                self._word(kind, text, newlines, index)
+            if kind != 'comment':
+                self.prev_kind = kind
+                self.prev = text
+        self._terminate()
+
+    # Helpers
+
+    @property
+    def frame(self):
+        return self.frames[-1]
+
+    def _statement_frame(self):
+        for frame in reversed(self.frames):
+            if frame.kind in ('block', 'object', 'case'):
+                return frame
+        return self.frames[0]
+
+    def _paren_depth(self):
+        depth = 0
+        for frame in reversed(self.frames):
+            if frame.kind not in ('paren', 'bracket'):
+                break
+            depth += 1
+        return depth
+
+    def _continuation_level(self):
+        return self._statement_frame().level + max(1, self._paren_depth())
+
+    def _newline(self, level=None):
+        builder = self.builder
+        if builder._pieces:
+            builder._flush()
+        builder._start_line(self._statement_frame().level if level is None else level)
+
+    def _blank_lines(self, newlines):
+        # Preserve blank lines between statements
+        for _ in range(min(newlines, 10) - 1):
+            self.builder.lines.append("")
+
+    def _print(self, text, space, wrap_point=None):
+        if wrap_point is None and self.prev in ('(', '[') and self.prev_kind == 'punct':
+            # The first token inside parentheses or brackets may move to the next line
+            wrap_point = True
+        if self.builder._push(text, space, self._continuation_level(), self._statement_frame().embedded, wrap_point):
+            for frame in self.frames:
+                if frame.kind in ('paren', 'bracket'):
+                    frame.wrapped = True
+
+    def _at_line_start(self):
+        return not self.builder._pieces
+
+    def _expects_expression(self):
+        prev = self.prev
+        if prev is None:
+            return True
+        if self.prev_kind == 'punct':
+            return prev not in (')', ']', '}', '++', '--')
+        if self.prev_kind == 'word':
+            return prev in EXPRESSION_KEYWORDS
+        return False
+
+    def _ends_statement(self):
+        # Whether the tokens printed so far form a complete statement that is missing its semicolon
+        if self.prev is None or self.frame.kind not in ('block', 'case'):
+            return False
+        if self.prev_kind in ('word', 'string'):
+            return self.prev not in SPACED_KEYWORDS or self.prev in ('return', 'break', 'continue')
+        if self.prev == '}':
+            return self.closed_object
+        return self.prev in (')', ']', '++', '--')
+
+    def _terminate(self):
+        if self._ends_statement():
+            self._print(';', False)
+            self.prev_kind, self.prev = 'punct', ';'
+
+    def _statement_break(self, newlines):
+        # A newline in the source between two complete statements (automatic semicolon insertion)
+        if newlines and not self._at_line_start() and self._ends_statement():
+            self._terminate()
+            self._newline()
+            self._blank_lines(newlines)
+            return True
+        if newlines and not self._at_line_start() and self.prev_kind == 'comment':
+            # A block comment on its own line before a statement stays there
+            self._newline()
+            return True
+        return False
+
+    def _after_close(self, text, newlines):
+        # Decide whether a token following '}' or ';' starts a new line
+        if self.prev == '}' and self.prev_kind == 'punct':
+            if text in CONTINUATION_KEYWORDS and not self.closed_object:
+                return False
+            if text in (')', ']', ',', ';', '.', '?.') or self.frame.kind in ('paren', 'bracket'):
+                return False
+            if (self.closed_object or self.frame.kind == 'object') and text != '}':
+                return False
+            self._newline()
+            self._blank_lines(newlines)
+            return True
+        if self.prev == ';' and self.prev_kind == 'punct' and self.frame.kind in ('block', 'case') \
+                and not self._at_line_start():
+            self._newline()
+            self._blank_lines(newlines)
+            return True
+        return False
+
+    def _space_before(self):
+        return not self._at_line_start() and self.prev not in ('(', '[', '.', '?.', '!', '~', '...', '@', '#') \
+            and not (self.prev in UNARY_OPERATORS and self._prev_unary) \
+            and not (self.prev in ('++', '--') and self._prev_unary)
+
+    _prev_unary = False
+
+    # Token handlers
+
+    def _word(self, kind, text, newlines, index):
+        if not self._after_close(text, newlines):
+            self._statement_break(newlines)
+        if text in ('case', 'default') and self._in_switch() and self.prev != '.':
+            if self.frame.kind == 'case':
+                self._terminate()
+                self.frames.pop()
+            self._newline(self.frame.level)
+        if text == 'null' and self.prev == 'return' and index + 1 < len(self.tokens) \
+                and self.tokens[index + 1][1] in (';', '}'):
+            # 'return null;' reads better as a bare 'return;'
+            return
+        self._print(text, self._space_before())
+        self._prev_unary = False
+
+    def _in_switch(self):
+        frame = self.frame
+        return frame.kind == 'case' or (frame.kind == 'block' and frame.opener == 'switch')
+
+    def _comment(self, text, newlines):
+        if newlines and not self._at_line_start():
+            self._newline()
+        # A comment that opens a statement must not make it look complete to automatic semicolon insertion
+        inline = self._ends_statement()
+        self._print(text, self._space_before() or self.prev == '!')
+        if text.startswith('//'):
+            self._newline()
+        else:
+            # jsbeautifier keeps a space after an inline block comment, even before a ';'
+            self.prev_kind, self.prev = 'word' if inline else 'comment', text
+
+    def _operator(self, text, newlines, index):
+        self._after_close(text, newlines)
+        if text in TIGHT_OPERATORS:
+            if newlines and not self._at_line_start():
+                self._newline(self._continuation_level())
+            self._print(text, False, wrap_point=True)
+            self._prev_unary = False
+            return
+        if text in ('++', '--'):
+            unary = self._expects_expression() or self.prev_kind is None
+            if not unary:
+                self._print(text, False)
+                self._prev_unary = False
+                return
+            self._print(text, self._space_before())
+            self._prev_unary = True
+            return
+
+        unary = text in UNARY_OPERATORS and self._expects_expression()
+        if unary:
+            self._print(text, self._space_before())
+            self._prev_unary = True
+            return
+        self._statement_break(newlines)
+        # Binary operators stay at the end of a wrapped line, so there is no wrap point before them
+        self._print(text, not self._at_line_start(), wrap_point=False)
+        self._prev_unary = False
+
+    def _question(self, text, newlines, index):
+        self.frame.ternaries += 1
+        self._print(text, True)
+        self._prev_unary = False
+
+    def _colon(self, text, newlines, index):
+        frame = self.frame
+        if frame.ternaries:
+            frame.ternaries -= 1
+            self._print(text, True)
+        elif frame.kind == 'case':
+            self._print(text, False)
+            self._newline(frame.level)
+        elif self._in_switch():
+            # 'case x:' opens the statements of the case, one level deeper than the label
+            self._print(text, False)
+            self.frames.append(_Frame('case', frame.level + 1, embedded=frame.embedded))
+            self._newline()
+        else:
+            self._print(text, False)
+        self._prev_unary = False
+
+    def _open_paren(self, text, newlines, index):
+        if not self._after_close(text, newlines):
+            self._statement_break(newlines)
+        opener = self.prev if self.prev_kind == 'word' else None
+        if self._at_line_start():
+            space = False
+        elif self.prev_kind == 'word':
+            space = self.prev in SPACED_KEYWORDS
+        elif self.prev_kind == 'punct':
+            space = self.prev not in ('(', '[', ')', ']', '.', '?.', '!', '~', '...') \
+                and not (self.prev in UNARY_OPERATORS and self._prev_unary)
+        else:
+            space = self.prev_kind == 'comment'
+        self._print(text, space)
+        self.frames.append(_Frame('paren', self._statement_frame().level, opener))
+        self._prev_unary = False
+
+    def _close_paren(self, text, newlines, index):
+        self._pop('paren')
+        self._print(text, False)
+        self._prev_unary = False
+
+    def _open_bracket(self, text, newlines, index):
+        if not self._after_close(text, newlines):
+            self._statement_break(newlines)
+        member = self.prev_kind in ('word', 'string') and self.prev not in SPACED_KEYWORDS \
+            or self.prev in (')', ']')
+        self._print(text, not member and self._space_before())
+        self.frames.append(_Frame('bracket', self._statement_frame().level))
+        self._prev_unary = False
+
+    def _close_bracket(self, text, newlines, index):
+        frame = self._pop('bracket')
+        if frame is not None and frame.wrapped:
+            # A wrapped array literal gets its closing bracket on a line of its own
+            self._newline(self._statement_frame().level + self._paren_depth())
+        self._print(text, False)
+        self._prev_unary = False
+
+    def _open_brace(self, text, newlines, index):
+        self._after_close(text, newlines)
+        prev = self.prev
+        opener = self._last_paren_opener if prev == ')' else None
+        following = self.tokens[index + 1] if index + 1 < len(self.tokens) else None
+        second = self.tokens[index + 2] if index + 2 < len(self.tokens) else None
+
+        # Same decision order as jsbeautifier: peek at the first two tokens, then look at what came before
+        if opener == 'switch' or self.frame.kind == 'case':
+            kind = 'block'
+        elif second is not None and (second[1] in (':', ',') and following[0] in ('word', 'string')
+                                     or following[1] in ('get', 'set', '...') and second[0] == 'word'):
+            kind = 'object'
+        elif prev == '=>':
+            kind = 'block'
+        elif self.prev_kind == 'punct' and prev not in (')', ']', '}', ';', '{') \
+                or prev in ('return', 'throw', 'import', 'default'):
+            kind = 'object'
+        else:
+            kind = 'block'
+        space = not self._at_line_start() and prev not in ('(', '[', '...')
+        statement = self._statement_frame()
+        embedded = statement.embedded
+        if kind == 'object' or prev == '=>' or prev == ')' and opener not in CONTROL_KEYWORDS:
+            embedded += 1
+        self._print(text, space)
+        self.frames.append(_Frame(kind, statement.level + 1, opener, embedded))
+
+        if index + 1 < len(self.tokens) and self.tokens[index + 1][1] == '}':
+            # Empty braces stay on one line
+            self._empty = True
+            return
+        self._empty = False
+        self._newline()
+        self._prev_unary = False
+
+    _empty = False
+    _last_paren_opener = None
+
+    def _close_brace(self, text, newlines, index):
+        self._terminate()
+        frame = self._pop_brace()
+        if not self._empty:
+            self._newline(frame.level - 1 if frame else self._statement_frame().level)
+        self._empty = False
+        self._print(text, False)
+        self.closed_object = frame is not None and frame.kind == 'object'
+        self._prev_unary = False
+
+    def _semicolon(self, text, newlines, index):
+        if self.prev == ';' and self.frame.kind in ('block', 'case'):
+            # Drop empty statements, e.g. after a serialized assignment that already ends with ';'
+            return
+        self._print(text, self.prev_kind == 'word' and self.prev.startswith('/*'))
+        self._prev_unary = False
+
+    def _comma(self, text, newlines, index):
+        self._print(text, False)
+        if self.frame.kind == 'object':
+            self._newline()
+        self._prev_unary = False
+
+    def _pop(self, kind):
+        frame = None
+        while len(self.frames) > 1:
+            frame = self.frames.pop()
+            if frame.kind == kind:
+                break
+            if frame.kind in ('block', 'object'):
+                # Unbalanced input, put the frame back and give up on matching
+                self.frames.append(frame)
+                return None
+        if kind == 'paren':
+            self._last_paren_opener = frame.opener if frame else None
+        return frame
+
+    def _pop_brace(self):
+        while len(self.frames) > 1:
+            frame = self.frames.pop()
+            if frame.kind in ('block', 'object'):
+                return frame
+        return None
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from version import __version__
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Modules whose code decides the output. Their source is part of every key, so a changed converter misses the entries
+# of the old one even when __version__ was not bumped.
+CONVERTER_MODULES = ('main', 'sfc', 'prefilter', 'template', 'js_parsers', 'parser', 'serializer', 'Vue2Component',
+                     'mixins', 'generator', 'builder', 'instance_api', 'symbols')
+
+_source_digest = None
+
+
+def source_digest():
+    # Hash of the converter's source files, read once per process
+    global _source_digest
+    if _source_digest is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in CONVERTER_MODULES:
+            with open(os.path.join(directory, module + '.py'), 'rb') as file:
+                digest.update(file.read())
+            digest.update(b'\0')
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+
+# Content-addressed store of converted outputs, keyed by the input, the tool version, the converter's source and the
+# generator options
+class ConversionCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, content, options=None):
+        digest = hashlib.sha256()
+        digest.update(__version__.encode())
+        digest.update(b'\0')
+        digest.update(source_digest().encode())
+        digest.update(b'\0')
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+        digest.update(b'\0')
+        digest.update(content.encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        # Fan out over 256 sub-directories so no single directory grows too large
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as file:
+                text = file.read()
+        except FileNotFoundError:
+            return None
+
+        # The modification time doubles as the last access time for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return text
+
+    def get(self, key):
+        output = self._read(key)
+        if output is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return output
+
+    def dependencies(self, key):
+        # The files an input depended on when it was last converted, as stored by put_dependencies, or None
+        text = self._read(key)
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def put_dependencies(self, key, files):
+        self.put(key, json.dumps(files))
+
+    def put(self, key, output):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so concurrent workers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(output)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.startswith('.tmp-'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self):
+        # Remove the least recently used entries until the cache fits in max_bytes
+        entries = list(self._entries())
+        total = sum(size for _, _, size in entries)
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
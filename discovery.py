@@ -0,0 +1,92 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+from fnmatch import fnmatch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INCLUDE = ('*.vue',)
+DEFAULT_LOOKAHEAD = 256
+
+
+def _matches(rel_path, patterns):
+    # Patterns with a '/' are matched against the path relative to the root, others against the name alone, so
+    # 'node_modules' excludes such a directory at any depth and 'legacy/*' only the top-level one
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch(rel_path if '/' in pattern else name, pattern) for pattern in patterns)
+
+
+def find_components(root, include=None, exclude=None):
+    # Walks lazily, so the first files are converted while the rest of the tree is still being listed
+    include = include or DEFAULT_INCLUDE
+    exclude = exclude or ()
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, '/')
+        prefix = '' if rel_dir == '.' else rel_dir + '/'
+        # Sort in place so the walk order (and the output log) is stable between runs; excluded directories are
+        # pruned instead of walked
+        dirnames[:] = sorted(name for name in dirnames if not _matches(prefix + name, exclude))
+        for filename in sorted(filenames):
+            rel_path = prefix + filename
+            if _matches(rel_path, include) and not _matches(rel_path, exclude):
+                yield os.path.join(dirpath, filename)
+
+
+# Estimates how long a file takes to convert: its time in an earlier run's manifest when there is one, otherwise its
+# size, scaled by that run's average time per byte so both kinds of estimate compare
+class FileCosts:
+    def __init__(self, root, manifest=None):
+        self.root = root
+        self.seconds = {}
+        self.seconds_per_byte = 1.0
+        if manifest:
+            self._load(manifest)
+
+    def _load(self, path):
+        total_seconds = total_bytes = 0
+        try:
+            file = open(path, 'r')
+        except FileNotFoundError:
+            logger.debug("No timings in %s, scheduling by file size", path)
+            return
+        with file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    seconds, size = entry['seconds'], entry['size']
+                except (ValueError, KeyError):
+                    continue
+                self.seconds[entry['path']] = seconds
+                total_seconds += seconds
+                total_bytes += size
+        if total_bytes:
+            self.seconds_per_byte = total_seconds / total_bytes
+        logger.debug("Loaded timings of %d files from %s", len(self.seconds), path)
+
+    def __call__(self, src_path):
+        seconds = self.seconds.get(os.path.relpath(src_path, self.root))
+        if seconds is not None:
+            return seconds
+        try:
+            return os.path.getsize(src_path) * self.seconds_per_byte
+        except OSError:
+            return 0.0
+
+
+def schedule(paths, cost, lookahead=DEFAULT_LOOKAHEAD):
+    # Largest-first within a sliding window of upcoming files. A big component found anywhere in the walk starts at
+    # most one window later, instead of at its place in the walk, so it does not hold up the end of the run while the
+    # other workers idle. Only the window is ever held in memory.
+    if lookahead <= 1:
+        yield from paths
+        return
+    heap = []
+    order = itertools.count()
+    for path in paths:
+        heapq.heappush(heap, (-cost(path), next(order), path))
+        if len(heap) >= lookahead:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
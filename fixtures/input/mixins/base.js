@@ -0,0 +1,7 @@
+export default {
+  methods: {
+    track(event) {
+      console.log('track', event);
+    }
+  }
+};
@@ -0,0 +1,19 @@
+import Base from './base';
+
+export default {
+  mixins: [Base],
+  props: { disabled: Boolean },
+  data() {
+    return { dirty: false };
+  },
+  computed: {
+    canSubmit() {
+      return !this.disabled && this.dirty;
+    }
+  },
+  methods: {
+    markDirty() {
+      this.dirty = true;
+    }
+  }
+};
@@ -1,39 +1,115 @@
+import logging
 import re
-import jsbeautifier
+
+import profiling
+from builder import CodeBuilder
+from instance_api import InstanceApiRewriter
+from symbols import SymbolTable
+
+logger = logging.getLogger(__name__)
+
+ASYNC_RE = re.compile(r'async\s+')
+NAME_RE = re.compile(r'[\w$]+')
+# What may follow the parameters of a function before its body
+BODY_START_RE = re.compile(r'\s*(?:=>\s*)?{')
+IDENTIFIER_RE = re.compile(r'[A-Za-z_$][\w$]*\Z')
+# A watch key setup() can read: a member, or a path into one like 'user.name' or '$route.query'
+WATCH_PATH_RE = re.compile(r'[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*\Z')
+RESERVED_WORDS = frozenset((
+    'await', 'break', 'case', 'catch', 'class', 'const', 'continue', 'debugger', 'default', 'delete', 'do', 'else',
+    'enum', 'export', 'extends', 'false', 'finally', 'for', 'function', 'if', 'implements', 'import', 'in',
+    'instanceof', 'interface', 'let', 'new', 'null', 'package', 'private', 'protected', 'public', 'return', 'static',
+    'super', 'switch', 'this', 'throw', 'true', 'try', 'typeof', 'var', 'void', 'while', 'with', 'yield',
+))
+
+
+def is_binding(name):
+    # Whether a member can be declared with const in setup(); quoted keys like 'a-b' or 'default' cannot
+    return IDENTIFIER_RE.match(name) is not None and name not in RESERVED_WORDS
+
+
+def object_key(name):
+    # A key as written in an object literal, quoted unless it is an identifier
+    if IDENTIFIER_RE.match(name):
+        return name
+    return "'" + name.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def split_function(source):
+    # Splits a function or arrow function into (async prefix, parameters, body). Matches what
+    #   re.match(r'(async\s+)?(\(.*?\)|[\w$]+)?\s*(?:=>\s*)?{(.*)}\s*$', source, re.DOTALL)
+    # would, but tries the candidates for the end of the parameters one by one in linear time: the regex retries its
+    # '{(.*)}' tail after every ')' and took seconds on large arrow functions with expression bodies.
+    stripped = source.rstrip()
+    if not stripped.endswith('}'):
+        return None
+    last = len(stripped) - 1
+
+    async_match = ASYNC_RE.match(source)
+    for start, async_prefix in ((async_match.end(), async_match.group(0)), (0, None)) if async_match else ((0, None),):
+        for end in _parameter_ends(source, start):
+            body_start = BODY_START_RE.match(source, end)
+            if body_start and body_start.end() <= last:
+                params = source[start:end] if end > start else None
+                return async_prefix, params, source[body_start.end():last]
+    return None
+
+
+def _parameter_ends(source, start):
+    # Where the parameters may end, in the order the regex tries them: after each ')' of a parenthesized list, after
+    # each prefix of a bare name from the longest down, and finally without any parameters
+    if source.startswith('(', start):
+        close = source.find(')', start)
+        while close != -1:
+            yield close + 1
+            close = source.find(')', close + 1)
+    name = NAME_RE.match(source, start)
+    if name:
+        yield from range(name.end(), start, -1)
+    yield start
+
+
+def pad_braces(text):
+    # Same as re.sub(r'{(.*)}', r'{ \1 }', text): pads from the first '{' to the last '}' of each line. Found with
+    # find/rfind, as the regex rescans the rest of the line from every '{' that has no '}' after it.
+    lines = text.split('\n')
+    for index, line in enumerate(lines):
+        start = line.find('{')
+        end = line.rfind('}')
+        if start != -1 and end > start:
+            lines[index] = f"{line[:start]}{{ {line[start + 1:end]} }}{line[end + 1:]}"
+    return '\n'.join(lines)
 
 
 class Vue3Generator:
-    def __init__(self, component):
+    DEFAULT_OPTIONS = {
+        'indent': "    ",
+        'wrap_line_length': 149,
+        # When False, setup() is laid out by CodeBuilder instead of a jsbeautifier round-trip
+        'beautify': True,
+        # Set when the scanner copied bodies from the source, which already have their line breaks and semicolons
+        'slice_source': False,
+    }
+
+    def __init__(self, component, **options):
         self.component = component
-        self.indent = "    "
+        self.options = {**self.DEFAULT_OPTIONS, **options}
+        self.indent = self.options['indent']
 
     def generate(self):
+        with profiling.phase('generate'):
+            return self._generate_component()
+
+    def _generate_component(self):
+        self._warn_unusable_names()
         imports = self._generate_imports()
         components = self._generate_components()
         mixins = self._generate_mixins()
         props = self._generate_props()
-        setup = self._generate_setup()
-
-        # Fixing syntax and making it look prettier
-        setup = re.sub(r"this\.\$store", r'store', setup)
-        setup = self.fix_this(setup)
-
-        # Remove 'props' if it's used only once
-        props_count = len(re.findall(r'\bprops\b', setup))
-        if props_count == 1:
-            setup = re.sub(r'\bprops\b', '', setup)
-
-        # add root
-        setup, imports = self.add_root_instance(setup, imports);
-        setup, imports = self.fix_nextTick(setup, imports);
-
-        # Beautify the setup function
-        options = jsbeautifier.default_options()
-        options.wrap_line_length = 149
-        setup = jsbeautifier.beautify(setup, options)
-        setup = re.sub(r'\)\s*$', ');', setup, flags=re.MULTILINE)
-        setup = re.sub(r';;\s*$', ';', setup, flags=re.MULTILINE)
-        setup = re.sub(r'return null;', 'return;', setup, flags=re.MULTILINE)
+        if self.options['beautify']:
+            setup, imports = self._beautified_setup(imports)
+        else:
+            setup, imports = self._build_setup(imports)
 
         # Generate component content
         component_content = [f"{self.indent}name: '{self.component.name}'"]
@@ -56,7 +132,7 @@ class Vue3Generator:
 
         # Wrap the component in defineComponent
         script_content = f"""
-<script>
+<script{self.component.script_attrs}>
 {imports}
 
 export default defineComponent({{
@@ -67,6 +143,79 @@ export default defineComponent({{
 
         return script_content.strip()
 
+    def _beautified_setup(self, imports):
+        setup = self._generate_setup()
+
+        # Rewrite this.member and this.$api in one pass, counting what setup() needs on the way
+        apis = self._instance_apis()
+        symbols = SymbolTable(self.component, apis)
+        setup = symbols.rewrite(setup)
+
+        # Only take props when something uses them, and add what the this.$ APIs need
+        context = apis.context()
+        uses_props = symbols.uses_props or bool(context)
+        uses_instance = symbols.uses_instance
+        preamble = "".join(f"\n{self.indent * 2}{line}" for line in apis.preamble(uses_instance))
+        setup = setup.replace("setup(props) {", self._setup_signature(uses_props, ()) + preamble + (preamble and "\n"),
+                              1)
+        imports = self._add_imports(imports, apis.imports(uses_instance))
+
+        # Beautify the setup function. jsbeautifier is only imported here, --no-beautify runs never load it.
+        import jsbeautifier
+        options = jsbeautifier.default_options()
+        options.indent_size = len(self.indent)
+        options.wrap_line_length = self.options['wrap_line_length']
+        with profiling.phase('beautify'):
+            setup = jsbeautifier.beautify(setup, options)
+        setup = re.sub(r'\)\s*$', ');', setup, flags=re.MULTILINE)
+        setup = re.sub(r';;\s*$', ';', setup, flags=re.MULTILINE)
+        setup = re.sub(r'return null;', 'return;', setup, flags=re.MULTILINE)
+        if context:
+            # Added after beautifying, which would spread the destructuring braces over several lines
+            setup = setup.replace("setup(props) {", self._setup_signature(True, context), 1)
+        return setup, imports
+
+    def _build_setup(self, imports):
+        # Same statements as _generate_setup, but each one is rewritten on its own and laid out by CodeBuilder,
+        # so the setup() body comes out indented and terminated without beautifying or patching the whole string
+        if not self._has_setup_content():
+            return "", imports
+
+        apis = self._instance_apis()
+        symbols = SymbolTable(self.component, apis)
+        statements = [symbols.rewrite(statement) for statement in self._setup_statements()]
+
+        uses_props = symbols.uses_props
+        uses_instance = symbols.uses_instance
+
+        builder = CodeBuilder(self.indent, self.options['wrap_line_length'])
+        builder.line(1, self._setup_signature(uses_props, apis.context()))
+        preamble = apis.preamble(uses_instance)
+        for line in preamble:
+            builder.line(2, line)
+        if preamble:
+            builder.blank()
+        imports = self._add_imports(imports, apis.imports(uses_instance))
+
+        for statement in statements:
+            if not statement:
+                builder.blank()
+                continue
+            with profiling.phase('layout'):
+                builder.code(2, statement, embedded=1)
+
+        return_items = self._return_items()
+        if return_items:
+            builder.line(2, "return {")
+            for index, item in enumerate(return_items):
+                builder.line(3, item + ("," if index < len(return_items) - 1 else ""))
+            builder.line(2, "};")
+        else:
+            builder.line(2, "return {};")
+        builder.line(1, "}")
+
+        return builder.getvalue(), imports
+
     def _generate_imports(self):
         imports = []
         vue_imports = ["defineComponent"]
@@ -90,9 +239,6 @@ export default defineComponent({{
 
         imports.append(f"import {{ {', '.join(sorted(vue_imports))} }} from 'vue'")
 
-        if self.component.uses_vuex:
-            imports.append("import { useStore } from 'js/store';")
-
         for import_statement in self.component.imports:
             if 'vuex' not in import_statement and 'mapGetters' not in import_statement:
                 imports.append(import_statement + ";")
@@ -102,15 +248,8 @@ export default defineComponent({{
         if not self.component.components:
             return ""
 
-        components_content = f"{self.indent}components: {{\n"
-        for name, value in self.component.components.items():
-            # if it is the last component, remove the comma
-            components_content += f"{self.indent * 2}{value},\n"
-            if name == list(self.component.components.keys())[-1]:
-                components_content = components_content[:-2] + "\n"
-        components_content += f"{self.indent}}}"
-
-        return components_content
+        components = ",\n".join(f"{self.indent * 2}{value}" for value in self.component.components.values())
+        return f"{self.indent}components: {{\n{components}\n{self.indent}}}"
 
     def _generate_mixins(self):
         if not self.component.mixins:
@@ -119,34 +258,64 @@ export default defineComponent({{
         mixins_content = f"{self.indent}mixins: [{', '.join(self.component.mixins)}]"
         return mixins_content
 
+    def _warn_unusable_names(self):
+        # Members that setup() cannot declare, and watchers of something it cannot read, are left out of it
+        for kind in ('data', 'computed', 'methods'):
+            for name in getattr(self.component, kind):
+                if not is_binding(name):
+                    logger.warning("Leaving %s %r out of setup(): it is not a valid identifier, rename it to "
+                                   "migrate it", kind, name)
+        for name in self.component.watch:
+            if not WATCH_PATH_RE.match(name):
+                logger.warning("Leaving the watcher of %r out of setup(): it is not a member or a path into one", name)
+
     def _generate_props(self):
         if not self.component.props:
             return ""
         prop_strings = []
         for prop, value in self.component.props.items():
-            prop_string = f"{self.indent}{self.indent}{prop}: {value}"
+            prop_string = f"{self.indent}{self.indent}{object_key(prop)}: {value}"
 
             # Remove single quotes around words using regex
             prop_string = re.sub(r"'(\w+)'", r'\1', prop_string)
             prop_string = re.sub(r"True", r'true', prop_string)
             prop_string = re.sub(r"False", r'false', prop_string)
-            prop_string = re.sub(r"{(.*)}", r'{ \1 }', prop_string)
+            prop_string = pad_braces(prop_string)
             prop_string = re.sub(r"\'\(\) \=\> \{\}'", r'() => {}', prop_string)
             prop_string = re.sub(r"\'\(\) \=\> \[\]'", r'() => {}', prop_string)
             prop_strings.append(prop_string)
         return ',\n'.join(prop_strings)
 
+    def _has_setup_content(self):
+        return bool(self.component.computed or self.component.methods or self.component.data
+                    or self.component.watch or self.component.lifecycle_hooks)
+
+    def _return_items(self):
+        return [name for name in [*self.component.computed, *self.component.methods, *self.component.data]
+                if is_binding(name)]
+
     def _generate_setup(self):
         # If there are no computed properties, methods, data, watch, or lifecycle hooks, return with no setup() method
-        if not self.component.computed and not self.component.methods and not self.component.data \
-                and not self.component.watch and not self.component.lifecycle_hooks:
+        if not self._has_setup_content():
             return ""
 
         setup_content = [f"{self.indent}setup(props) {{"]
+        setup_content.extend(self._setup_statements())
 
-        if self.component.uses_vuex:
-            setup_content.append(f"{self.indent}{self.indent}const store = useStore();")
-            setup_content.append('')
+        # Return statement
+        return_items = self._return_items()
+        return_statement = f"{self.indent}{self.indent}return {{"
+        return_statement += f"\n{self.indent}{self.indent}{self.indent}" + f",\n{self.indent}{self.indent}{self.indent}".join(
+            return_items)
+        return_statement += f"\n{self.indent}{self.indent}}};"
+
+        setup_content.append(return_statement)
+        setup_content.append(f"{self.indent}}}")
+
+        return "\n".join(setup_content)
+
+    def _setup_statements(self):
+        setup_content = []
 
         setup_content.extend(self._generate_reactive_vars())
 
@@ -160,54 +329,23 @@ export default defineComponent({{
 
         setup_content.extend(self._generate_lifecycle_hooks())
 
-        # Return statement
-        return_items = list(self.component.computed.keys()) + list(self.component.methods.keys()) + list(
-            self.component.data.keys())
-        return_statement = f"{self.indent}{self.indent}return {{"
-        return_statement += f"\n{self.indent}{self.indent}{self.indent}" + f",\n{self.indent}{self.indent}{self.indent}".join(
-            return_items)
-        return_statement += f"\n{self.indent}{self.indent}}};"
-
-        setup_content.append(return_statement)
-        setup_content.append(f"{self.indent}}}")
-
-        return "\n".join(setup_content)
+        return setup_content
 
     def _generate_store_getters(self):
         content = []
         for name, body in self.component.computed.items():
-            if body.startswith('store.getters.'):
+            if body.startswith('store.getters.') and is_binding(name):
                 content.append(f"{self.indent}{self.indent}const {name} = computed(() => {body});")
         if content:
             content.append('')
         return content
 
     def _generate_computed(self):
+        # The scanner leaves each getter as a function, or a { get, set } object, that computed() takes as it is
         content = []
         for name, body in self.component.computed.items():
-            if not body.startswith('store.getters.'):
-                # Remove 'function()' wrapper
-                body = body.replace('function()', '').strip()
-
-                # Check if it's a multi-statement function
-                if ';' in body or '\n' in body:
-                    if body.startswith('{') and body.endswith('}'):
-                        body = body[1:-1].strip()
-
-                    body_lines = body.split(';')
-                    indented_body = '\n'.join(
-                        f"{self.indent}{self.indent}{self.indent}{line.strip()}"
-                        for line in body_lines if line.strip()
-                    )
-                    content.append(
-                        f"{self.indent}{self.indent}const {name} = computed({{\n{indented_body}\n{self.indent}{self.indent}}});"
-                    )
-                else:
-                    if body.startswith('{ ') and body.endswith(' }'):
-                        body = body[2:-2].strip()
-                    if body.startswith('return '):  # 15 to remove the duplicated ()=>{ as well as return
-                        body = body[7:].strip()
-                    content.append(f"{self.indent}{self.indent}const {name} = computed(() => {body});")
+            if not body.startswith('store.getters.') and is_binding(name):
+                content.append(f"{self.indent}{self.indent}const {name} = computed({body});")
         if content:
             content.append('')
         return content
@@ -215,6 +353,8 @@ export default defineComponent({{
     def _generate_reactive_vars(self):
         content = []
         for name, value in self.component.data.items():
+            if not is_binding(name):
+                continue
             content.append(f"{self.indent}{self.indent}const {name} = ref({value});")
         if content:
             content.append('')
@@ -223,6 +363,8 @@ export default defineComponent({{
     def _generate_methods(self):
         content = []
         for name, body in self.component.methods.items():
+            if not is_binding(name):
+                continue
             formatted_body = self._format_method_body(body)
             content.append(f"{self.indent}{self.indent}const {name} = {formatted_body};")
 
@@ -235,12 +377,20 @@ export default defineComponent({{
         body = re.sub(r'^\s*function\s*', '', body.strip())
 
         # Split the function into parameters and body
-        match = re.match(r'(\(.*?\))?\s*{(.*)}\s*$', body, re.DOTALL)
-        if not match:
+        parts = split_function(body)
+        if not parts:
             return body  # Return as-is if it doesn't match expected format
 
-        params, body_content = match.groups()
-        params = params or '()'
+        async_prefix, params, body_content = parts
+        params = (async_prefix or '') + (params or '()')
+
+        if not self.options['beautify']:
+            # CodeBuilder indents and terminates the statements itself
+            return f"{params} => {{ {body_content.strip()} }}"
+
+        if self.options['slice_source']:
+            # Keep the original lines, a line comment would otherwise swallow the rest of the body
+            return f"{params} => {{\n{body_content.strip()}\n}}"
 
         # Format the body content
         formatted_body = self._format_body_content(body_content)
@@ -288,12 +438,19 @@ export default defineComponent({{
 
     def _generate_watch(self):
         content = []
+        refs = {*self.component.data, *self.component.computed} - set(self.component.props)
         for name, body in self.component.watch.items():
-            # if the name can be found in the props object
-            if name in self.component.props:
-                content.append(f"{self.indent}{self.indent}watch(() => {name}, {body});")
+            if not WATCH_PATH_RE.match(name):
+                continue
+            if name in refs and is_binding(name):
+                source = name
+            elif name.startswith('$') and '.' not in name:
+                # An instance API such as $route, which setup() holds as a reactive object
+                source = f"this.{name}"
             else:
-                content.append(f"{self.indent}{self.indent}watch({name}, {body});")
+                # Props, mixin members and paths are read by a getter, this. is rewritten along with the rest of setup()
+                source = f"() => this.{name}"
+            content.append(f"{self.indent}{self.indent}watch({source}, {body});")
         return content
 
     def _generate_lifecycle_hooks(self):
@@ -309,69 +466,32 @@ export default defineComponent({{
                 f"{self.indent}{self.indent}{vue3_hook}({self.indent}{self.indent}{self.indent}{body}\n{self.indent}{self.indent});")
         return content
 
-    def fix_this(self, setup):
-        for prop in self.component.props:
-            setup = re.sub(r'\bthis\.' + prop + r'\b', 'props.' + prop, setup)
-
-        for data in self.component.data:
-            setup = re.sub(r'\bthis\.' + data + r'\b', data + '.value', setup)
-
-        for method in self.component.methods:
-            setup = re.sub(r'\bthis\.' + method + r'\b', method, setup)
-
-        for computed in self.component.computed:
-            setup = re.sub(r'\bthis\.' + computed + r'\b', computed + '.value', setup)
-
-        return setup
-
-    def add_root_instance(self, script, imports):
-        if re.search(r'this\.\$\w+', script):
-            setup_match = re.search(r'(setup\s*\([^)]*\)\s*{)', script)
-            if setup_match:
-                setup_start = setup_match.start(1)
-                setup_end = setup_match.end(1)
-
-                # Prepare the lines to insert
-                insert_lines = f"\n{self.indent * 2}const instance = getCurrentInstance();\n{self.indent * 2}const root = instance.proxy.$root;\n"
-
-                modified_script = (
-                        script[:setup_end] +
-                        insert_lines +
-                        script[setup_end:]
-                )
-
-                vue_import_match = re.search(r'import\s*{([^}]*)}\s*from\s*[\'"]vue[\'"]', imports)
-                if vue_import_match:
-                    current_imports = vue_import_match.group(1)
-                    if 'getCurrentInstance' not in current_imports:
-                        new_imports = current_imports + ', getCurrentInstance'
-                        new_imports = ', '.join(sorted(set(new_imports.replace(' ', '').split(','))))
-                        updated_import = f"import {{ {new_imports} }} from 'vue'"
-                        imports = imports.replace(vue_import_match.group(0), updated_import)
-                else:
-                    imports += "\nimport { getCurrentInstance } from 'vue';"
-
-                return modified_script, imports
-
-        # If no modifications were made, return the original content
-        return script, imports
-
-    def fix_nextTick(self, script, imports):
-        if re.search(r'this\.\$nextTick', script):
-            # Replace this.$nextTick with nextTick
-            script = re.sub(r'this\.\$nextTick', 'nextTick', script)
-
-            vue_import_match = re.search(r'import\s*{([^}]*)}\s*from\s*[\'"]vue[\'"]', imports)
-            if vue_import_match:
-                current_imports = vue_import_match.group(1)
-                if 'nextTick' not in current_imports:
-                    new_imports = current_imports + ', nextTick'
-                    new_imports = ', '.join(sorted(set(new_imports.replace(' ', '').split(','))))
-                    updated_import = f"import {{ {new_imports} }} from 'vue';"
-                    imports = imports.replace(vue_import_match.group(0), updated_import)
-            else:
-                imports += "\nimport { nextTick } from 'vue';"
-
-            return script, imports
-
-        return script, imports
+    def _instance_apis(self):
+        apis = InstanceApiRewriter()
+        if self.component.uses_vuex:
+            # The getters from mapGetters read the store as well
+            apis.use('store')
+        return apis
+
+    def _setup_signature(self, uses_props, context):
+        params = ['props'] if uses_props or context else []
+        if context:
+            params.append(f"{{ {', '.join(context)} }}")
+        return f"setup({', '.join(params)}) {{"
+
+    def _add_imports(self, imports, needed):
+        # Names are merged into an existing import of their module, new modules are imported after the vue import
+        added = []
+        for module, names in needed.items():
+            match = re.search(r'import\s*{([^}]*)}\s*from\s*[\'"]' + re.escape(module) + r'[\'"];?', imports)
+            if match is None:
+                added.append(f"import {{ {', '.join(names)} }} from '{module}';")
+                continue
+            current = [name.strip() for name in match.group(1).split(',') if name.strip()]
+            if any(name not in current for name in names):
+                merged = ', '.join(sorted({*current, *names}))
+                imports = imports.replace(match.group(0), f"import {{ {merged} }} from '{module}';", 1)
+        if added:
+            first, newline, rest = imports.partition('\n')
+            imports = '\n'.join([first, *added]) + newline + rest
+        return imports
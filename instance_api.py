@@ -0,0 +1,109 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+INSTANCE_PREAMBLE = "const instance = getCurrentInstance();"
+
+
+# What a Vue2 instance API, used as this.$name, becomes inside setup():
+#   replacement  the expression this.$name is replaced with
+#   imports      (module, name) pairs the replacement needs
+#   preamble     statements at the top of setup() that declare the replacement
+#   context      names destructured from the second argument of setup()
+#   instance     whether it needs `instance` from getCurrentInstance()
+#   warning      logged when the API has no Vue3 equivalent and the rewrite is only a stopgap
+class InstanceRule:
+    __slots__ = ('replacement', 'imports', 'preamble', 'context', 'instance', 'warning')
+
+    def __init__(self, replacement, imports=(), preamble=(), context=(), instance=False, warning=None):
+        self.replacement = replacement
+        self.imports = imports
+        self.preamble = preamble
+        self.context = context
+        self.instance = instance
+        self.warning = warning
+
+
+def _proxy(name, warning=None):
+    # Still reachable through the public instance, e.g. app.config.globalProperties such as this.$api
+    return InstanceRule(f'instance.proxy.${name}', instance=True, warning=warning)
+
+
+# Rules by API name. Their order is the order of the preamble statements in setup().
+RULES = {
+    'store': InstanceRule('store', imports=[('js/store', 'useStore')], preamble=["const store = useStore();"]),
+    'route': InstanceRule('route', imports=[('vue-router', 'useRoute')], preamble=["const route = useRoute();"]),
+    'router': InstanceRule('router', imports=[('vue-router', 'useRouter')], preamble=["const router = useRouter();"]),
+    'root': InstanceRule('root', preamble=["const root = instance.proxy.$root;"], instance=True),
+    'nextTick': InstanceRule('nextTick', imports=[('vue', 'nextTick')]),
+    'emit': InstanceRule('emit', context=['emit']),
+    'attrs': InstanceRule('attrs', context=['attrs']),
+    'slots': InstanceRule('slots', context=['slots']),
+    # Listeners are part of $attrs in Vue3, as on* properties
+    'listeners': InstanceRule('attrs', context=['attrs'],
+                              warning="this.$listeners was merged into $attrs in Vue3, listeners are on* attributes"),
+    # Reactivity tracks added and deleted properties in Vue3, so plain assignment and delete do what these did
+    'set': InstanceRule('Reflect.set'),
+    'delete': InstanceRule('Reflect.deleteProperty'),
+    'refs': _proxy('refs'),
+    'el': _proxy('el'),
+    'parent': _proxy('parent'),
+    'options': _proxy('options'),
+    'watch': _proxy('watch'),
+    'forceUpdate': _proxy('forceUpdate'),
+    'on': _proxy('on', warning="this.$on was removed in Vue3, use an event emitter library such as mitt"),
+    'off': _proxy('off', warning="this.$off was removed in Vue3, use an event emitter library such as mitt"),
+    'once': _proxy('once', warning="this.$once was removed in Vue3, use an event emitter library such as mitt"),
+}
+
+_ORDER = {name: index for index, name in enumerate(RULES)}
+
+
+# Looks up the rule of each this.$name the symbol table meets and collects what the rules used so far need, for the
+# generator to add to setup() and the imports afterwards
+class InstanceApiRewriter:
+    def __init__(self):
+        self.used = {}
+
+    def use(self, name):
+        rule = self.used.get(name)
+        if rule is None:
+            # Anything without a rule of its own, such as a plugin's this.$http, lives on the instance
+            rule = self.used[name] = RULES.get(name) or _proxy(name)
+            if rule.warning:
+                logger.warning("%s", rule.warning)
+        return rule
+
+    def _rules(self):
+        # In registry order, whatever order the code used them in
+        return [self.used[name] for name in sorted(self.used, key=lambda name: _ORDER.get(name, len(_ORDER)))]
+
+    @property
+    def needs_instance(self):
+        return any(rule.instance for rule in self.used.values())
+
+    def preamble(self, instance=False):
+        # instance is set when code outside these rules, e.g. mixin members, refers to the instance as well
+        lines = [INSTANCE_PREAMBLE] if instance or self.needs_instance else []
+        for rule in self._rules():
+            lines.extend(line for line in rule.preamble if line not in lines)
+        return lines
+
+    def context(self):
+        names = []
+        for rule in self._rules():
+            names.extend(name for name in rule.context if name not in names)
+        return names
+
+    def imports(self, instance=False):
+        # module -> names, with getCurrentInstance from vue whenever the instance is used
+        imports = {}
+        if instance or self.needs_instance:
+            imports['vue'] = ['getCurrentInstance']
+        for rule in self._rules():
+            for module, name in rule.imports:
+                names = imports.setdefault(module, [])
+                if name not in names:
+                    names.append(name)
+        return imports
+
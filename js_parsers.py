@@ -0,0 +1,195 @@
+import atexit
+import json
+import logging
+import shutil
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ParseError(Exception):
+    pass
+
+
+class ParserUnavailable(Exception):
+    pass
+
+
+# Parses with the pure-Python esprima port. Always available, but slow on big scripts and limited to ES2017.
+class EsprimaParser:
+    name = 'esprima'
+
+    def parse(self, source, ranges=False):
+        # Imported on first use: loading esprima builds its Unicode tables, which takes about half a second that runs
+        # parsing with Node.js, --help and cache hits have no need to pay. Budgeted runs import it earlier, in
+        # main.warm_up, since an import cut short by a budget would be retried by every file.
+        import esprima
+        try:
+            return esprima.parseModule(source, {'range': ranges})
+        except esprima.Error as e:
+            raise ParseError(str(e)) from e
+
+
+# ESTree node decoded from a Node.js backend. Missing attributes read as None, like esprima's nodes, so the scanner
+# and serializer handle both without checks.
+class Node:
+    def __init__(self, fields):
+        self.__dict__ = fields
+
+    def __getattr__(self, name):
+        return None
+
+    def __repr__(self):
+        return f"Node({self.__dict__.get('type')!r})"
+
+
+# Reads one JSON request per line, answers with one JSON line. Positions are dropped unless ranges are requested and
+# function nodes get esprima's isAsync, so the tree looks like the one esprima builds.
+NODE_SCRIPT = r"""
+const readline = require('readline');
+const name = process.argv[1];
+let parse;
+if (name === 'babel') {
+    const babel = require('@babel/parser');
+    parse = (source, ranges) => babel.parse(source, {
+        sourceType: 'module', ranges, plugins: ['estree', 'typescript'],
+    }).program;
+} else {
+    const acorn = require('acorn');
+    parse = (source, ranges) => acorn.parse(source, {ecmaVersion: 'latest', sourceType: 'module', ranges});
+}
+
+function normalize(root, ranges) {
+    const stack = [root];
+    while (stack.length) {
+        const node = stack.pop();
+        if (Array.isArray(node)) {
+            for (const item of node) {
+                if (item && typeof item === 'object') stack.push(item);
+            }
+            continue;
+        }
+        delete node.start;
+        delete node.end;
+        delete node.loc;
+        if (!ranges) delete node.range;
+        if ('async' in node) node.isAsync = node.async;
+        // JSON has no BigInt; the serializer copies numeric literals from raw anyway
+        if (typeof node.value === 'bigint') node.value = Number(node.value);
+        for (const key in node) {
+            const value = node[key];
+            if (value && typeof value === 'object' && key !== 'regex' && key !== 'range') stack.push(value);
+        }
+    }
+    return root;
+}
+
+const lines = readline.createInterface({input: process.stdin});
+lines.on('line', (line) => {
+    const request = JSON.parse(line);
+    let response;
+    try {
+        response = {ast: normalize(parse(request.source, request.ranges), request.ranges)};
+    } catch (e) {
+        response = {error: e.message};
+    }
+    process.stdout.write(JSON.stringify(response) + '\n');
+});
+"""
+
+
+# npm package each Node.js backend loads
+NODE_MODULES = {'acorn': 'acorn', 'babel': '@babel/parser'}
+
+_node_modules = {}
+
+
+def node_module_available(module, node='node'):
+    # Whether Node.js resolves the package from the working directory, as the parser process will, e.g. from the
+    # project's node_modules or NODE_PATH. Checked once per process.
+    if module not in _node_modules:
+        executable = shutil.which(node)
+        available = False
+        if executable is not None:
+            try:
+                available = subprocess.run([executable, '-e', f'require.resolve({json.dumps(module)})'],
+                                           capture_output=True, timeout=30).returncode == 0
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        _node_modules[module] = available
+    return _node_modules[module]
+
+
+# Parses with a JavaScript parser running in one long-lived Node.js process, started on first use. acorn (the
+# default when installed) handles the latest ECMAScript syntax, babel also TypeScript.
+class NodeParser:
+    def __init__(self, name='acorn', node='node'):
+        self.name = name
+        self.node = shutil.which(node)
+        if self.node is None:
+            raise ParserUnavailable(f"The {name} parser needs Node.js, but '{node}' was not found on PATH")
+        if not node_module_available(NODE_MODULES[name], node):
+            raise ParserUnavailable(f"The {name} parser needs the {NODE_MODULES[name]} package, install it with "
+                                    f"npm install {NODE_MODULES[name]}")
+        self.process = None
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _start(self):
+        self.process = subprocess.Popen([self.node, '-e', NODE_SCRIPT, self.name],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding='utf-8')
+
+    def parse(self, source, ranges=False):
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            try:
+                self.process.stdin.write(json.dumps({'source': source, 'ranges': ranges}) + '\n')
+                self.process.stdin.flush()
+                line = self.process.stdout.readline()
+            except OSError as e:
+                raise ParseError(f"{self.name} parser process failed: {e}") from e
+            except BaseException:
+                # Interrupted mid-request, e.g. by a time budget: its reply would be read as the next file's, so the
+                # process is stopped and the next call starts a fresh one
+                self.process.kill()
+                self.process.wait()
+                self.process = None
+                raise
+        if not line:
+            # The process died, e.g. because the parser module is not installed; the next call starts a new one
+            raise ParseError(f"{self.name} parser process exited with code {self.process.wait()}")
+
+        response = json.loads(line, object_hook=Node)
+        if response.error is not None:
+            raise ParseError(response.error)
+        return response.ast
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+
+BACKENDS = {
+    'esprima': EsprimaParser,
+    'acorn': lambda: NodeParser('acorn'),
+    'babel': lambda: NodeParser('babel'),
+}
+
+_parsers = {}
+
+
+def get_parser(name='auto'):
+    # One parser per backend and process, so a Node.js backend is started once and then reused for every file. auto
+    # only picks acorn when Node.js can load it, and falls back to esprima otherwise.
+    if name == 'auto':
+        name = 'acorn' if node_module_available('acorn') else 'esprima'
+    if name not in _parsers:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown parser backend {name!r}, expected one of {', '.join(BACKENDS)} or auto")
+        _parsers[name] = BACKENDS[name]()
+        logger.debug("Using the %s parser", name)
+    return _parsers[name]
@@ -1,58 +1,434 @@
-from parser import Vue2Scanner
-from generator import Vue3Generator
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+import profiling
+from budget import Budget, BudgetExceeded, paused
+from js_parsers import BACKENDS, ParserUnavailable, get_parser
+from prefilter import MIXINS_RE, skip_reason
+from sfc import find_block, find_script_block, replace_spans, split_sfc
+from template import rewrite_template
 # import jsbeautifier
 
+logger = logging.getLogger(__name__)
+
+# Read once while the process is still single-threaded; output files get the permissions open() would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def configure_logging(level):
+    # Debug output names the module it comes from; the regular progress messages are printed as they are
+    log_format = "%(levelname)s %(name)s: %(message)s" if level <= logging.DEBUG else "%(message)s"
+    # Warnings are always emitted, so batch manifests can record them, and the console handler filters by level
+    logging.basicConfig(level=min(level, logging.WARNING), format=log_format, force=True)
+    logging.getLogger().handlers[0].setLevel(level)
+
+
 def read_file(file_path):
     with open(file_path, 'r') as file:
         return file.read()
 
 
 def write_file(file_path, content):
-    with open(file_path, 'w') as file:
-        file.write(content)
+    # Write next to the target and rename it over the target, so an interrupted run never leaves a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _cache_lookup(cache, content, options):
+    with profiling.phase('cache'):
+        cache_key = cache.key(content, options)
+        cached = cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Cache hit, skipping conversion")
+    return cache_key, cached
+
+
+def _dependencies_key(cache, content, options, path):
+    # Where the mixin files of the last conversion are recorded. Relative imports resolve against the component's
+    # directory, so the same source in another directory has a record of its own.
+    base = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    return cache.key(content, {**options, 'mixin_base': base})
+
+
+def _mixin_cache_lookup(cache, content, options, path):
+    # The output also depends on the mixin files, so it is keyed on the (mtime, size) of the ones resolved by the last
+    # conversion of this input. While none of them changed, that entry is used without scanning anything.
+    from mixins import file_version
+    with profiling.phase('cache'):
+        files = cache.dependencies(_dependencies_key(cache, content, options, path))
+        if files is None or any(file_version(file[0]) != file for file in files):
+            cache.misses += 1
+            return None
+    return _cache_lookup(cache, content, {**options, 'mixin_files': files})[1]
+
+
+def convert_vue2_to_vue3(content, options=None, cache=None, path=None):
+    # path is the component's file, which relative mixin imports are resolved against
+    options = options or {}
+    resolve_mixins = options.get('resolve_mixins', False)
+    # Only a script with a mixins option depends on other files; any other one is looked up before it is scanned
+    uses_mixins = resolve_mixins and MIXINS_RE.search(content) is not None
+    cache_key = None
+    if cache is not None:
+        with paused():
+            if uses_mixins:
+                cached = _mixin_cache_lookup(cache, content, options, path)
+            else:
+                cache_key, cached = _cache_lookup(cache, content, options)
+        if cached is not None:
+            return cached
 
+    logger.debug("Starting conversion process")
 
-def convert_vue2_to_vue3(content):
-    print("DEBUG: Starting conversion process")
+    # The scanner and generator are imported once a script really has to be converted, so --help, cache hits and runs
+    # where the prefilter skips every file start without them
+    from generator import Vue3Generator
+    from mixins import get_index
+    from parser import Vue2Scanner
 
-    scanner = Vue2Scanner(content)
+    scanner = Vue2Scanner(content, slice_source=options.get('slice_source', False),
+                          parser=options.get('parser', 'auto'))
     component = scanner.scan()
 
-    print("\nDEBUG: Scanned component details:")
-    print(f"Name: {component.name}")
-    print(f"Props: {component.props}")
-    print(f"Computed: {component.computed}")
-    print(f"Methods: {component.methods}")
-    print(f"Watch: {component.watch}")
-    print(f"Lifecycle hooks: {component.lifecycle_hooks}")
-    print(f"Uses Vuex: {component.uses_vuex}")
-    print(f"Imports: {component.imports}")
-    print(f"Components: {component.components}")
-    print(f"Data: {component.data}")
-
-    generator = Vue3Generator(component)
+    files = []
+    if resolve_mixins and component.mixins:
+        with profiling.phase('mixins'), paused():
+            files = get_index(options.get('mixin_aliases'), options.get('parser', 'auto')).annotate(component, path)
+    if cache is not None and uses_mixins:
+        with profiling.phase('cache'), paused():
+            cache_key = cache.key(content, {**options, 'mixin_files': files})
+            cache.put_dependencies(_dependencies_key(cache, content, options, path), files)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Scanned component details:\n"
+                     "Name: %s\nProps: %s\nComputed: %s\nMethods: %s\nWatch: %s\nLifecycle hooks: %s\n"
+                     "Uses Vuex: %s\nImports: %s\nComponents: %s\nData: %s",
+                     component.name, component.props, component.computed, component.methods, component.watch,
+                     component.lifecycle_hooks, component.uses_vuex, component.imports, component.components,
+                     component.data)
+
+    generator = Vue3Generator(component, **options)
     converted = generator.generate()
 
-    print("\nDEBUG: Generated content:")
-    print(converted)
+    logger.debug("Generated content:\n%s", converted)
+
+    if cache is not None:
+        with profiling.phase('cache'), paused():
+            cache.put(cache_key, converted)
 
     return converted
 
 
-def main():
-    input_file = "input.txt"
-    output_file = "output.txt"
+# Converted once before the first budgeted file or request, so the parser backend (esprima's import, the Node.js
+# process), the converter modules, jsbeautifier and the regex caches are loaded outside of any budget
+WARM_UP_COMPONENT = """<template>
+  <div :title.sync="title">{{ title | upper }}</div>
+</template>
+
+<script>
+export default {
+  props: { title: String },
+  data() {
+    return { count: 0 };
+  },
+  computed: {
+    double() {
+      return this.count * 2;
+    }
+  },
+  methods: {
+    increment() {
+      this.count++;
+      this.$emit('changed', this.count);
+    }
+  },
+  mounted() {
+    this.$nextTick(() => this.increment());
+  }
+};
+</script>
+"""
+
+
+def warm_up(options):
+    # Never budgeted: an import interrupted by a budget is dropped from sys.modules and retried, and failed, by every
+    # later file
+    convert_sfc(WARM_UP_COMPONENT, options=options)
+
+
+def convert_sfc(content, options=None, cache=None, path=None, budget=None):
+    # Returns (status, output, message): the message is the error of a failed file and the reason a file was skipped.
+    # A file that runs out of its budget is reported as failed and copied unchanged, instead of holding up the run
+    try:
+        with budget or Budget():
+            return _convert_sfc(content, options or {}, cache, path)
+    except BudgetExceeded as e:
+        return 'failed', content, str(e)
+
+
+def _convert_sfc(content, options, cache, path):
+    with profiling.phase('split'):
+        blocks = split_sfc(content)
+        script_block = find_script_block(blocks)
+        template_block = find_block(blocks, 'template') if options.get('rewrite_template', True) else None
+
+    replacements = []
+    if template_block is not None:
+        with profiling.phase('template'):
+            template = rewrite_template(template_block.content)
+        if template != template_block.content:
+            replacements.append((template_block.content_start, template_block.content_end, template))
+
+    if script_block is None:
+        reason = "only <script setup>" if find_block(blocks, 'script') else "no <script> block"
+    elif options.get('prefilter', True):
+        # Already migrated and plain scripts are recognized from the text, before paying for a parse
+        with profiling.phase('prefilter'):
+            reason = skip_reason(script_block.content)
+    else:
+        reason = None
+
+    if reason is None:
+        try:
+            converted = convert_vue2_to_vue3(script_block.text, options=options, cache=cache, path=path)
+        except Exception as e:
+            return 'failed', content, str(e)
+        replacements.append((script_block.start, script_block.end, converted))
+    else:
+        logger.debug("Not converting the script: %s", reason)
 
-    print(f"DEBUG: Reading input from {input_file}")
+    if not replacements:
+        # Nothing to migrate, the file is mirrored unchanged so the output tree stays complete
+        return 'skipped', content, reason
+
+    # Styles, custom blocks and whatever did not change are copied from the original around the new parts
+    return 'converted', replace_spans(content, replacements), None
+
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Convert Vue2 Options API components to the Vue3 Composition API")
+    arg_parser.add_argument("input", nargs="?", default="input.txt",
+                            help="Vue2 component file, or a directory to convert every .vue file in it")
+    arg_parser.add_argument("output", nargs="?", default="output.txt",
+                            help="Output file, or the output directory when converting a directory")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None,
+                            help="Number of worker processes for directory conversion (default: CPU count)")
+    verbosity = arg_parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_const", dest="log_level", const=logging.DEBUG,
+                           default=logging.INFO,
+                           help="Log every conversion step, including the scanned and generated code")
+    verbosity.add_argument("-q", "--quiet", action="store_const", dest="log_level", const=logging.ERROR,
+                           help="Only report errors")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help="Reuse conversions of unchanged inputs stored in this directory")
+    arg_parser.add_argument("--cache-size", type=int, default=256,
+                            help="Maximum size of the conversion cache in MB (default: 256)")
+    arg_parser.add_argument("--async-io", action="store_true",
+                            help="Read and write files in threads of the main process while the workers only convert, "
+                                 "for trees on slow or network storage")
+    arg_parser.add_argument("--io-threads", type=int, default=8,
+                            help="Threads reading and writing files with --async-io (default: 8)")
+    arg_parser.add_argument("--manifest", metavar="PATH", default=None,
+                            help="Log every converted file of a directory run to this JSON Lines file")
+    arg_parser.add_argument("--resume", action="store_true",
+                            help="Skip the files the --manifest of an earlier, interrupted run already completed")
+    arg_parser.add_argument("--include", action="append", default=None, metavar="GLOB",
+                            help="Only convert files matching GLOB; patterns without a '/' match file names, others "
+                                 "paths relative to the input directory (repeatable, default: *.vue)")
+    arg_parser.add_argument("--exclude", action="append", default=None, metavar="GLOB",
+                            help="Skip files and directories matching GLOB, e.g. node_modules (repeatable)")
+    arg_parser.add_argument("--costs", metavar="MANIFEST", default=None,
+                            help="Start the files that took longest in this earlier --manifest first (default: the "
+                                 "--manifest being replaced, if any; otherwise the largest files start first)")
+    arg_parser.add_argument("--lookahead", type=int, default=256, metavar="N",
+                            help="Number of upcoming files to reorder by cost; 0 converts in directory order "
+                                 "(default: 256)")
+    arg_parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                            help="Give up on a file that takes longer than this to convert, report it as failed and "
+                                 "copy it unchanged")
+    arg_parser.add_argument("--cpu-budget", type=float, default=None, metavar="SECONDS",
+                            help="Likewise for the CPU time spent converting a file")
+    arg_parser.add_argument("-w", "--watch", action="store_true",
+                            help="Keep running and re-convert components whenever their content changes")
+    arg_parser.add_argument("--poll-interval", type=float, default=0.2,
+                            help="Seconds between checks for changed files in watch mode (default: 0.2)")
+    arg_parser.add_argument("--debounce", type=float, default=0.3,
+                            help="Seconds a file must stay unchanged before it is re-converted in watch mode (default: 0.3)")
+    arg_parser.add_argument("--no-beautify", dest="beautify", action="store_false",
+                            help="Lay out setup() with the built-in code builder instead of jsbeautifier (faster)")
+    arg_parser.add_argument("--no-template", dest="rewrite_template", action="store_false",
+                            help="Only convert the <script> block and leave the <template> as it is")
+    arg_parser.add_argument("--no-prefilter", dest="prefilter", action="store_false",
+                            help="Parse every script, instead of skipping those that already use defineComponent or "
+                                 "the Composition API, or have no Options API to migrate")
+    arg_parser.add_argument("--slice-source", action="store_true",
+                            help="Copy method, computed, watcher and hook bodies from the original script, keeping "
+                                 "comments and formatting, instead of rebuilding them from the syntax tree")
+    arg_parser.add_argument("--parser", choices=['auto', *BACKENDS], default='auto',
+                            help="JavaScript parser: acorn and babel run in a Node.js process and are faster and "
+                                 "support newer syntax, esprima is pure Python (default: acorn if Node.js can "
+                                 "load it, else esprima)")
+    arg_parser.add_argument("--no-mixin-index", dest="resolve_mixins", action="store_false",
+                            help="Do not read imported mixins to find the members components inherit from them")
+    arg_parser.add_argument("--alias", action="append", default=[], metavar="PREFIX=DIR",
+                            help="Resolve mixin imports starting with PREFIX in DIR, e.g. @=src (repeatable)")
+    arg_parser.add_argument("--serve", action="store_true",
+                            help="Keep running and answer JSON-RPC conversion requests, one per line, on stdin")
+    arg_parser.add_argument("--socket", metavar="PATH", default=None,
+                            help="Like --serve, but listen on a Unix socket at PATH")
+    arg_parser.add_argument("--analyze", metavar="REPORT", default=None,
+                            help="Only scan the input and write a JSON report of the Vue2 features that make the "
+                                 "migration harder, with a score per file; nothing is converted")
+    arg_parser.add_argument("--profile", metavar="REPORT", default=None,
+                            help="Time every conversion phase per file and write a JSON report of the slowest ones")
+    arg_parser.add_argument("--profile-memory", action="store_true",
+                            help="Also record memory allocated per phase in the --profile report (slower)")
+    arg_parser.add_argument("--cprofile", metavar="STATS", default=None,
+                            help="Run under cProfile and save the stats; directories are then converted in-process")
+    args = arg_parser.parse_args(argv)
+    if args.resume and not args.manifest:
+        arg_parser.error("--resume needs the --manifest of the run to resume")
+    for name, seconds in (('--time-budget', args.time_budget), ('--cpu-budget', args.cpu_budget)):
+        if seconds is not None and seconds <= 0:
+            arg_parser.error(f"{name} must be a positive number of seconds")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(args.log_level)
+    if args.cprofile:
+        profiling.cprofile(args.cprofile, run, args)
+        logger.info("cProfile stats written to %s", args.cprofile)
+    else:
+        run(args)
+
+
+def run(args):
+    options = {'beautify': args.beautify, 'slice_source': args.slice_source, 'parser': args.parser,
+               'resolve_mixins': args.resolve_mixins, 'rewrite_template': args.rewrite_template,
+               'prefilter': args.prefilter, 'mixin_aliases': dict(alias.split('=', 1) for alias in args.alias)}
+    try:
+        get_parser(args.parser)
+    except ParserUnavailable as e:
+        raise SystemExit(str(e))
+    budget = Budget(args.time_budget, args.cpu_budget)
+
+    if args.serve or args.socket:
+        from server import ConversionServer
+
+        cache = None
+        if args.cache_dir:
+            from cache import ConversionCache
+
+            cache = ConversionCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+        server = ConversionServer(options=options, cache=cache, budget=budget)
+        server.warm_up()
+        try:
+            if args.socket:
+                server.serve_socket(args.socket)
+            else:
+                server.serve_stdio(sys.stdin, sys.stdout)
+        except KeyboardInterrupt:
+            pass
+        except FileExistsError as e:
+            raise SystemExit(str(e))
+        logger.info("Served %d requests", server.requests)
+        return
+
+    if args.analyze:
+        from analyzer import CodebaseAnalyzer
+
+        CodebaseAnalyzer(args.input, workers=args.jobs, log_level=args.log_level,
+                         options=options, include=args.include, exclude=args.exclude).write_report(args.analyze)
+        return
+
+    if args.watch:
+        from watcher import ComponentWatcher
+
+        cache = None
+        if args.cache_dir:
+            from cache import ConversionCache
+
+            cache = ConversionCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+        watcher = ComponentWatcher(args.input, args.output, interval=args.poll_interval,
+                                   debounce=args.debounce, cache=cache, options=options, include=args.include,
+                                   exclude=args.exclude, budget=budget)
+        watcher.run()
+        return
+
+    if os.path.isdir(args.input):
+        if args.async_io:
+            from pipeline import AsyncBatchConverter as BatchConverter
+
+            extra = {'io_threads': args.io_threads}
+        else:
+            from batch import BatchConverter
+
+            extra = {}
+        converter = BatchConverter(args.input, args.output, workers=args.jobs, log_level=args.log_level,
+                                   cache_dir=args.cache_dir, cache_size=args.cache_size * 1024 * 1024, options=options,
+                                   profile=args.profile, profile_memory=args.profile_memory,
+                                   in_process=bool(args.cprofile), manifest=args.manifest, resume=args.resume,
+                                   include=args.include, exclude=args.exclude, costs=args.costs,
+                                   lookahead=args.lookahead, budget=budget, **extra)
+        converter.run()
+        return
+
+    cache = None
+    if args.cache_dir:
+        from cache import ConversionCache
+
+        cache = ConversionCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    input_file = args.input
+    output_file = args.output
+
+    logger.debug("Reading input from %s", input_file)
     content = read_file(input_file)
 
-    converted_content = convert_vue2_to_vue3(content)
+    if budget:
+        warm_up(options)
+
+    profiler = None
+    if args.profile:
+        profiler = profiling.Profiler(track_memory=args.profile_memory).activate()
+        profiler.start_file(input_file)
+
+    status, converted_content, error = convert_sfc(content, options=options, cache=cache, path=input_file,
+                                                   budget=budget)
     # converted_content = jsbeautifier.beautify(converted_content)
 
-    print(f"\nDEBUG: Writing output to {output_file}")
+    if profiler is not None:
+        profiler.add(profiler.end_file())
+        profiler.deactivate()
+        profiler.write_report(args.profile)
+        logger.info("Profile report written to %s", args.profile)
+    if status == 'failed':
+        # Exits with status 1, so scripts and CI notice a file that was not converted, budget overruns included
+        raise SystemExit(f"Conversion of {input_file} failed: {error}")
+    if status == 'skipped':
+        logger.info("Nothing to convert in %s: %s", input_file, error)
+
+    logger.debug("Writing output to %s", output_file)
     write_file(output_file, converted_content)
 
-    print(f"Conversion complete. Output written to {output_file}")
+    logger.info("Conversion complete. Output written to %s", output_file)
+
+    if cache is not None:
+        cache.evict()
+        logger.info("Cache: %d hits, %d misses", cache.hits, cache.misses)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean the output is done; failed files are tried again on resume
+COMPLETED = ('converted', 'skipped')
+
+
+# Append-only JSON Lines log of a batch run, one entry per file as soon as it finishes. Entries are flushed one by
+# one and never rewritten, so the log survives a crash up to the last finished file and costs no memory as it grows.
+class Manifest:
+    def __init__(self, path, resume=False):
+        self.path = path
+        # Relative input path -> (size, mtime_ns) of inputs an earlier run completed
+        self.complete_line = True
+        self.completed = self._load() if resume else {}
+        self.file = open(path, 'a' if resume else 'w')
+        if not self.complete_line:
+            # Terminate the cut-off line, so the first new entry does not get glued to it
+            self.file.write('\n')
+
+    def _load(self):
+        completed = {}
+        try:
+            file = open(self.path, 'r')
+        except FileNotFoundError:
+            return completed
+        with file:
+            for line in file:
+                self.complete_line = line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line of a run that was killed while writing it
+                    continue
+                # Later entries win, e.g. a file that failed once and was converted by the resumed run
+                if entry.get('status') in COMPLETED:
+                    completed[entry['path']] = (entry['size'], entry['mtime_ns'])
+                else:
+                    completed.pop(entry.get('path'), None)
+        logger.info("Resuming from %s: %d files already done", self.path, len(completed))
+        return completed
+
+    def is_done(self, path, src_path, dst_path):
+        # Done if an earlier run finished this exact input and its output is still there
+        done = self.completed.get(path)
+        if done is None:
+            return False
+        try:
+            stat = os.stat(src_path)
+        except OSError:
+            return False
+        return done == (stat.st_size, stat.st_mtime_ns) and os.path.exists(dst_path)
+
+    def append(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,136 @@
+import logging
+import os
+
+from js_parsers import ParseError
+from parser import Vue2Scanner
+
+logger = logging.getLogger(__name__)
+
+# Tried in order when an import names a module without its extension
+EXTENSIONS = ('.js', '.mjs', '.ts', '.vue')
+
+
+# Resolves the mixins a component imports to their files and records which instance members each one provides.
+# Every mixin file is scanned once and kept until it changes on disk, so a mixin shared by hundreds of components is
+# parsed once per process instead of once per component.
+class MixinIndex:
+    def __init__(self, aliases=None, parser='auto'):
+        # Import prefixes mapped to directories, e.g. {'@': 'src'}; the longest matching prefix wins
+        self.aliases = sorted((aliases or {}).items(), key=lambda alias: len(alias[0]), reverse=True)
+        self.parser = parser
+        # Real path -> ((mtime_ns, size), member names, {path: (mtime_ns, size)} of the file and the mixins it uses)
+        self.entries = {}
+        self.scans = 0
+        self.hits = 0
+        self.unresolved = set()
+
+    def annotate(self, component, path):
+        # Fill in component.mixin_members; the component's own members are left to the generator to prefer. Returns
+        # the mixin files read for them as [path, mtime_ns, size] lists, which conversion cache entries are keyed on.
+        members = {}
+        files = {}
+        base = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+        for name in component.mixins:
+            source = component.mixin_sources.get(name)
+            if source is None:
+                continue
+            file = self.resolve(base, source)
+            if file is None:
+                if source not in self.unresolved:
+                    self.unresolved.add(source)
+                    logger.warning("Could not resolve mixin %s from '%s'", name, source)
+                continue
+            for member in self.members(file):
+                members.setdefault(member, name)
+            entry = self.entries.get(file)
+            if entry is not None:
+                files.update(entry[2])
+        component.mixin_members = members
+        return [[file, *version] for file, version in sorted(files.items())]
+
+    def resolve(self, base, source):
+        if source.startswith('.'):
+            target = os.path.join(base, source)
+        else:
+            for prefix, directory in self.aliases:
+                if source == prefix or source.startswith(prefix + '/'):
+                    target = os.path.join(directory, source[len(prefix):].lstrip('/'))
+                    break
+            else:
+                # A package import, e.g. a mixin from node_modules
+                return None
+
+        candidates = [target, *(target + extension for extension in EXTENSIONS),
+                      *(os.path.join(target, 'index' + extension) for extension in EXTENSIONS)]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return os.path.realpath(candidate)
+        return None
+
+    def members(self, file, resolving=None):
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return ()
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.get(file)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        # Guards against mixins that (indirectly) include themselves
+        resolving = resolving or set()
+        if file in resolving:
+            return ()
+        resolving.add(file)
+
+        mixin = self._scan(file)
+        members = [*mixin.props, *mixin.data, *mixin.computed, *mixin.methods]
+        files = {file: version}
+        # Members of mixins the mixin itself uses end up on the instance too. They are folded into this entry, so an
+        # edit to a nested mixin alone is only picked up in the next process.
+        for name in mixin.mixins:
+            source = mixin.mixin_sources.get(name)
+            nested = self.resolve(os.path.dirname(file), source) if source else None
+            if nested is not None:
+                members.extend(self.members(nested, resolving))
+                if nested in self.entries:
+                    files.update(self.entries[nested][2])
+
+        members = tuple(dict.fromkeys(members))
+        self.entries[file] = (version, members, files)
+        return members
+
+    def _scan(self, file):
+        self.scans += 1
+        logger.debug("Scanning mixin %s", file)
+        with open(file, 'r') as handle:
+            source = handle.read()
+        scanner = Vue2Scanner(source, parser=self.parser)
+        try:
+            if file.endswith('.vue'):
+                return scanner.scan()
+            return scanner.scan_script(source)
+        except ParseError as e:
+            logger.warning("Could not parse mixin %s: %s", file, e)
+            return scanner.component
+
+
+def file_version(path):
+    # The [path, mtime_ns, size] of a file as annotate() reports it, or None once it is gone
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+_indexes = {}
+
+
+def get_index(aliases=None, parser='auto'):
+    # One index per configuration and process, shared by every component converted in it
+    key = (tuple(sorted((aliases or {}).items())), parser)
+    if key not in _indexes:
+        _indexes[key] = MixinIndex(aliases, parser)
+    return _indexes[key]
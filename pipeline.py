@@ -0,0 +1,78 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from batch import BatchConverter, _init_worker, convert_text, manifest_entry, read_input, write_output
+
+
+# Directory conversion as an asyncio pipeline: the tree is walked and files are read and written by a pool of I/O
+# threads in this process, while the worker processes only convert. Slow storage such as a network mount then keeps
+# the workers waiting only when the I/O threads cannot keep up, instead of every worker stalling on its own reads.
+#
+#   walk -> paths -> read (I/O threads) -> contents -> convert (processes) -> outputs -> write (I/O threads)
+#
+# Each arrow is a bounded queue. When a later stage falls behind, the queue in front of it fills up and the earlier
+# stages wait, so no more than a few files per worker are held in memory however large the tree is.
+class AsyncBatchConverter(BatchConverter):
+    def __init__(self, *args, io_threads=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.io_threads = io_threads
+
+    def _run_pool(self, init_args):
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=init_args) as executor, \
+                ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix='io') as io:
+            asyncio.run(self._pipeline(executor, io))
+
+    async def _pipeline(self, executor, io):
+        loop = asyncio.get_running_loop()
+        paths = asyncio.Queue(self.max_pending)
+        contents = asyncio.Queue(self.max_pending)
+        outputs = asyncio.Queue(self.max_pending)
+        # Two conversions per worker keep every process busy while results travel back
+        converters = self.workers * 2
+        readers = writers = max(1, self.io_threads // 2)
+
+        async def walk():
+            # Listing a directory blocks as well, so the walk advances in the I/O threads too
+            sources = self._sources()
+            while (src_path := await loop.run_in_executor(io, next, sources, None)) is not None:
+                await paths.put(src_path)
+
+        async def read():
+            while (src_path := await paths.get()) is not None:
+                start = time.perf_counter()
+                try:
+                    stat, content = await loop.run_in_executor(io, read_input, src_path)
+                except (OSError, UnicodeError) as e:
+                    # Undecodable files included, e.g. a latin-1 .vue file, so one bad file does not abort the run
+                    self._record((src_path, 'failed', f"Cannot read {src_path}: {e}", False, None, None))
+                    continue
+                await contents.put((src_path, stat, content, start))
+
+        async def convert():
+            while (item := await contents.get()) is not None:
+                result = await loop.run_in_executor(executor, convert_text, item[0], item[2], self.options)
+                await outputs.put((item, result))
+
+        async def write():
+            while (item := await outputs.get()) is not None:
+                (src_path, stat, content, start), (status, output, error, cache_hit, warnings, record) = item
+                try:
+                    await loop.run_in_executor(io, write_output, self._output_path(src_path), output)
+                except (OSError, UnicodeError) as e:
+                    status, error = 'failed', f"Cannot write {self._output_path(src_path)}: {e}"
+                self._record((src_path, status, error, cache_hit, record,
+                              manifest_entry(content, stat, start, warnings)))
+
+        async def stage(worker, count, next_queue=None, next_count=0):
+            # Run count copies of a stage, then tell each consumer of the next stage that nothing more is coming
+            await asyncio.gather(*(worker() for _ in range(count)))
+            for _ in range(next_count):
+                await next_queue.put(None)
+
+        await asyncio.gather(
+            stage(walk, 1, paths, readers),
+            stage(read, readers, contents, converters),
+            stage(convert, converters, outputs, writers),
+            stage(write, writers),
+        )
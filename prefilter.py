@@ -0,0 +1,39 @@
+import re
+
+# Options the converter moves into setup() or rewrites; a component without any of them has nothing to migrate
+OPTION_KEYS = (
+    'data', 'methods', 'computed', 'watch', 'props', 'mixins', 'beforeCreate', 'created', 'beforeMount', 'mounted',
+    'beforeUpdate', 'updated', 'beforeDestroy', 'destroyed', 'activated', 'deactivated',
+)
+
+# What follows `export default`: an object literal, or the name of whatever else is exported
+EXPORT_DEFAULT_RE = re.compile(r'\bexport\s+default\s*(\{|[\w$.]+)')
+
+
+def _key_re(keys):
+    # A key in an object literal: after '{' or ',' and any comments, written as `key:` or `key(...) {`. Calls such as
+    # watch(source, callback) or computed(() => ...) inside setup() do not match.
+    return re.compile(r'''[{,](?:\s|//[^\n]*|/\*[\s\S]*?\*/)*(?:async\s+)?['"]?(?:%s)['"]?\s*(?::|\([^()]*\)\s*\{)'''
+                      % '|'.join(keys))
+
+
+OPTION_RE = _key_re(OPTION_KEYS)
+SETUP_RE = _key_re(('setup',))
+MIXINS_RE = _key_re(('mixins',))
+
+
+def skip_reason(script):
+    # Why the script needs no conversion, or None when it may have Options API code. Decided with a few regular
+    # expressions over the text before anything is parsed; when in doubt the script is converted.
+    targets = [match.group(1) for match in EXPORT_DEFAULT_RE.finditer(script)]
+    if not targets:
+        return "no export default"
+    if '{' not in targets:
+        if 'defineComponent' in targets:
+            return "already wrapped in defineComponent"
+        return f"export default is {targets[0]}, not an options object"
+    if OPTION_RE.search(script):
+        return None
+    if SETUP_RE.search(script):
+        return "already uses the Composition API"
+    return "no Options API to migrate"
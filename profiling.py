@@ -0,0 +1,143 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# Phases are no-ops until a Profiler is activated, so the hooks in the pipeline cost one global lookup per call
+_active = None
+_NO_PHASE = nullcontext()
+
+
+def phase(name):
+    if _active is None:
+        return _NO_PHASE
+    return _active.phase(name)
+
+
+def active():
+    return _active
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._switch(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._switch(None)
+        return False
+
+
+# Records wall time, and optionally allocated memory, per phase per file. Phases nest: time spent in an inner phase
+# (e.g. parse inside scan) is charged only to the inner one, so the phase totals of a file add up to its total time.
+class Profiler:
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.files = []
+        self._file = None
+        self._stack = []
+        self._started_at = 0.0
+        self._memory_at = 0
+        self._file_memory_at = 0
+
+    def activate(self):
+        global _active
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active = self
+        return self
+
+    def deactivate(self):
+        global _active
+        _active = None
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def start_file(self, path):
+        self._file = {'path': path, 'seconds': 0.0, 'phases': {}}
+        self._stack = ['other']
+        if self.track_memory:
+            self._file['peak_bytes'] = 0
+            tracemalloc.reset_peak()
+            self._memory_at = self._file_memory_at = tracemalloc.get_traced_memory()[0]
+        self._started_at = time.perf_counter()
+
+    def end_file(self):
+        self._charge(time.perf_counter())
+        record = self._file
+        record['seconds'] = sum(entry['seconds'] for entry in record['phases'].values())
+        if self.track_memory:
+            # Peak growth over what was already allocated when the file started
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - self._file_memory_at
+        self._file = None
+        return record
+
+    def _charge(self, now):
+        # Credit the time (and memory) since the last switch to the phase on top of the stack
+        if self._file is None:
+            return
+        entry = self._file['phases'].setdefault(self._stack[-1], {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += now - self._started_at
+        self._started_at = now
+        if self.track_memory:
+            memory = tracemalloc.get_traced_memory()[0]
+            entry['allocated_bytes'] = entry.get('allocated_bytes', 0) + memory - self._memory_at
+            self._memory_at = memory
+
+    def _switch(self, name):
+        self._charge(time.perf_counter())
+        if self._file is None:
+            return
+        if name is None:
+            self._stack.pop()
+        else:
+            self._stack.append(name)
+            self._file['phases'].setdefault(name, {'seconds': 0.0, 'calls': 0})['calls'] += 1
+
+    def add(self, record):
+        # Batch workers send their records back to the parent, which collects them here for the report
+        self.files.append(record)
+
+    def report(self, top=20):
+        phases = {}
+        for record in self.files:
+            for name, entry in record['phases'].items():
+                total = phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+                for key, value in entry.items():
+                    total[key] = total.get(key, 0) + value
+
+        total_seconds = sum(record['seconds'] for record in self.files)
+        for total in phases.values():
+            total['share'] = total['seconds'] / total_seconds if total_seconds else 0.0
+
+        return {
+            'files': len(self.files),
+            'seconds': total_seconds,
+            'phases': dict(sorted(phases.items(), key=lambda item: item[1]['seconds'], reverse=True)),
+            'slowest_files': sorted(self.files, key=lambda record: record['seconds'], reverse=True)[:top],
+        }
+
+    def write_report(self, path, top=20):
+        report = self.report(top)
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        return report
+
+
+def cprofile(path, function, *args, **kwargs):
+    # Run function under cProfile and save the stats for pstats or snakeviz, even if the run fails
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
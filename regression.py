@@ -0,0 +1,292 @@
+import argparse
+import difflib
+import gc
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from discovery import find_components
+from js_parsers import BACKENDS, ParseError, ParserUnavailable, get_parser
+from main import WARM_UP_COMPONENT, convert_sfc, read_file, write_file
+from parser import Vue2Scanner
+from generator import Vue3Generator
+from sfc import find_script_block, split_sfc
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('scan', 'generate')
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+# Shorter than importing esprima (about 0.4s), and still ample for converting a small component
+BUDGET_CHECK_SECONDS = 0.2
+
+
+def fixture_pairs(fixtures, golden):
+    # A single input file is compared with a single golden file, e.g. input.txt and output.txt; a directory with the
+    # files at the same relative paths below the golden directory
+    if not os.path.isdir(fixtures):
+        yield os.path.basename(fixtures), fixtures, golden
+        return
+    for src_path in find_components(fixtures):
+        name = os.path.relpath(src_path, fixtures)
+        yield name, src_path, os.path.join(golden, name)
+
+
+def _best(function, repeat):
+    # Best of the repeats with the garbage collector off, as timeit does, since a collection landing in one phase
+    # would otherwise read as a regression
+    best = float('inf')
+    result = None
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best, result
+
+
+def time_phases(content, options, repeat):
+    # Scan and generate timed on their own, like benchmark.py, so a slower jsbeautifier or cache does not hide or
+    # fake a regression in Vue2Scanner or Vue3Generator
+    script_block = find_script_block(split_sfc(content))
+    if script_block is None:
+        return {}
+    parser = options.get('parser', 'auto')
+    slice_source = options.get('slice_source', False)
+    scan, component = _best(lambda: Vue2Scanner(script_block.text, slice_source=slice_source, parser=parser).scan(),
+                            repeat)
+    generate, _ = _best(lambda: Vue3Generator(component, **options).generate(), repeat)
+    return {'scan': scan, 'generate': generate}
+
+
+# Converts every fixture, compares the output with its golden file and the scan and generate times with a stored
+# baseline. With update set, the goldens and the baseline are rewritten from this run instead.
+class RegressionRun:
+    def __init__(self, fixtures, golden, baseline=None, options=None, repeat=5, threshold=1.25, min_delta=0.002,
+                 update=False):
+        self.fixtures = fixtures
+        self.golden = golden
+        self.baseline_path = baseline
+        self.options = options or {}
+        self.repeat = repeat
+        # The run fails when the total of a phase over the fixtures is threshold times its baseline. Files that are
+        # both threshold times and min_delta seconds slower are listed to show where the time went; on their own
+        # they are too noisy to fail on.
+        self.threshold = threshold
+        self.min_delta = min_delta
+        self.update = update
+        self.baseline = self._load_baseline()
+        self.timings = {}
+        self.changed = []
+        self.missing = []
+        self.slower_files = []
+        self.regressions = []
+        self.invalid = []
+
+    def _load_baseline(self):
+        if not self.baseline_path or self.update or not os.path.exists(self.baseline_path):
+            return None
+        with open(self.baseline_path, 'r') as file:
+            baseline = json.load(file)
+        if baseline.get('options') != self.options:
+            logger.warning("Baseline %s was recorded with options %s, this run uses %s", self.baseline_path,
+                           baseline.get('options'), self.options)
+        return baseline
+
+    def run(self):
+        for name, src_path, golden_path in fixture_pairs(self.fixtures, self.golden):
+            content = read_file(src_path)
+            _, output, error = convert_sfc(content, options=self.options, path=src_path)
+            if error:
+                # A fixture that fails to convert is still compared: its golden file is the unchanged input
+                logger.debug("%s failed to convert: %s", name, error)
+            self._compare(name, golden_path, output)
+            self._check_syntax(name, output)
+            self.timings[name] = time_phases(content, self.options, self.repeat)
+            self._check_timings(name)
+        self._check_totals()
+
+        if self.update and self.baseline_path:
+            with open(self.baseline_path, 'w') as file:
+                json.dump({'options': self.options, 'files': self.timings}, file, indent=2, sort_keys=True)
+        return not (self.changed or self.missing or self.regressions or self.invalid)
+
+    def _check_syntax(self, name, output):
+        # A golden file is only worth matching if it is valid JavaScript, so every script block of an output has to
+        # parse. Checked with esprima whatever the parser option, TypeScript blocks are left out as it cannot read them.
+        for block in split_sfc(output):
+            if block.type != 'script' or block.attrs.get('lang') in ('ts', 'tsx'):
+                continue
+            try:
+                get_parser('esprima').parse(block.content)
+            except ParseError as e:
+                self.invalid.append((name, str(e)))
+
+    def _compare(self, name, golden_path, output):
+        if self.update:
+            os.makedirs(os.path.dirname(golden_path) or '.', exist_ok=True)
+            write_file(golden_path, output)
+            return
+        try:
+            expected = read_file(golden_path)
+        except FileNotFoundError:
+            self.missing.append(name)
+            return
+        if output != expected:
+            diff = difflib.unified_diff(expected.splitlines(keepends=True), output.splitlines(keepends=True),
+                                        f"{name} (golden)", f"{name} (output)")
+            self.changed.append((name, ''.join(diff)))
+
+    def _check_timings(self, name):
+        if self.baseline is None:
+            return
+        before = self.baseline['files'].get(name)
+        if before is None:
+            return
+        for phase, seconds in self.timings[name].items():
+            previous = before.get(phase)
+            if previous and seconds > previous * self.threshold and seconds - previous > self.min_delta:
+                self.slower_files.append((name, phase, previous, seconds))
+
+    def _totals(self, files):
+        # Only the fixtures present in both runs are compared
+        return {phase: sum(files[name].get(phase, 0) for name in self.timings if name in files) for phase in PHASES}
+
+    def _check_totals(self):
+        if self.baseline is None:
+            return
+        before = self._totals(self.baseline['files'])
+        after = self._totals(self.timings)
+        for phase in PHASES:
+            if before[phase] and after[phase] > before[phase] * self.threshold:
+                self.regressions.append((phase, before[phase], after[phase]))
+
+    def report(self, diff_lines=40):
+        totals = self._totals(self.timings)
+        print(f"{len(self.timings)} fixtures, scan {totals['scan'] * 1000:.1f}ms, "
+              f"generate {totals['generate'] * 1000:.1f}ms")
+        if self.baseline is not None:
+            before = self._totals(self.baseline['files'])
+            for phase in PHASES:
+                if before[phase]:
+                    print(f"  {phase}: {totals[phase] / before[phase]:.2f}x the baseline")
+        for name, error in self.invalid:
+            print(f"INVALID JS: {name}: {error}")
+        if self.update:
+            print(f"Golden files written to {self.golden}"
+                  + (f", baseline to {self.baseline_path}" if self.baseline_path else ""))
+            return
+
+        for name in self.missing:
+            print(f"MISSING GOLDEN: {name}")
+        for name, diff in self.changed:
+            print(f"CHANGED: {name}")
+            lines = diff.splitlines()
+            print('\n'.join(lines[:diff_lines]))
+            if len(lines) > diff_lines:
+                print(f"... {len(lines) - diff_lines} more lines")
+        for phase, previous, seconds in self.regressions:
+            print(f"REGRESSED: {phase} {previous * 1000:.1f}ms -> {seconds * 1000:.1f}ms "
+                  f"({seconds / previous:.2f}x, threshold {self.threshold:g}x)")
+        for name, phase, previous, seconds in self.slower_files:
+            print(f"  slower: {name} {phase} {previous * 1000:.2f}ms -> {seconds * 1000:.2f}ms "
+                  f"({seconds / previous:.2f}x)")
+        if not (self.changed or self.missing or self.regressions or self.invalid):
+            print("OK: every output matches its golden file" + (" and no phase regressed" if self.baseline else ""))
+
+
+def budget_failures(parser='auto', seconds=BUDGET_CHECK_SECONDS):
+    # Converts a small component under a time budget in fresh interpreters, where nothing is loaded yet: once as a
+    # single file and once as a directory of copies with one worker. Setup such as importing the parser backend has
+    # to happen before the budget is armed, otherwise every file runs out of it. Returns what failed.
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        src_dir, dst_dir = os.path.join(tmp, 'input'), os.path.join(tmp, 'output')
+        os.mkdir(src_dir)
+        for i in range(3):
+            write_file(os.path.join(src_dir, f'Component{i}.vue'), WARM_UP_COMPONENT)
+        budget_args = ['--time-budget', str(seconds), '--parser', parser, '-q']
+
+        src_path, dst_path = os.path.join(src_dir, 'Component0.vue'), os.path.join(tmp, 'Component0.vue')
+        result = subprocess.run([sys.executable, MAIN, src_path, dst_path, *budget_args], capture_output=True, text=True)
+        if result.returncode != 0 or not os.path.exists(dst_path):
+            failures.append(f"single file: {result.stderr.strip() or f'exit code {result.returncode}'}")
+
+        manifest = os.path.join(tmp, 'manifest.jsonl')
+        subprocess.run([sys.executable, MAIN, src_dir, dst_dir, '-j', '1', '--manifest', manifest, *budget_args],
+                       capture_output=True, text=True)
+        entries = [json.loads(line) for line in read_file(manifest).splitlines()] if os.path.exists(manifest) else []
+        if len(entries) != 3:
+            failures.append(f"directory: {len(entries)} of 3 files recorded")
+        failures.extend(f"directory: {entry['path']}: {entry['error']}" for entry in entries
+                        if entry['status'] == 'failed')
+    return failures
+
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare converter output with golden files and timings with a "
+                                                     "stored baseline")
+    arg_parser.add_argument("fixtures", nargs="?", default="input.txt",
+                            help="Vue2 component file, or a directory of them (default: input.txt)")
+    arg_parser.add_argument("golden", nargs="?", default="output.txt",
+                            help="Expected output file, or the directory of expected outputs (default: output.txt)")
+    arg_parser.add_argument("--baseline", metavar="PATH", default=None,
+                            help="JSON file of per-file scan and generate times to compare with, or to write with "
+                                 "--update")
+    arg_parser.add_argument("--update", action="store_true",
+                            help="Accept the current output and timings: rewrite the golden files and the baseline")
+    arg_parser.add_argument("--threshold", type=float, default=1.25,
+                            help="Fail when scanning or generating all fixtures takes this many times the baseline "
+                                 "(default: 1.25)")
+    arg_parser.add_argument("--min-delta", type=float, default=2.0, metavar="MS",
+                            help="Do not list files slower by less than this many milliseconds (default: 2)")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=5,
+                            help="Timed repetitions per phase, the best one counts (default: 5)")
+    arg_parser.add_argument("--no-beautify", dest="beautify", action="store_false",
+                            help="Convert with the code builder instead of jsbeautifier")
+    arg_parser.add_argument("--slice-source", action="store_true",
+                            help="Convert copying bodies from the source")
+    arg_parser.add_argument("--parser", choices=['auto', *BACKENDS], default='auto',
+                            help="JavaScript parser (default: auto)")
+    arg_parser.add_argument("--no-budget-check", dest="budget_check", action="store_false",
+                            help="Skip converting a small component under a %ss time budget in fresh processes"
+                                 % BUDGET_CHECK_SECONDS)
+    return arg_parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Conversion warnings would drown the report
+    logging.basicConfig(level=logging.ERROR)
+    try:
+        get_parser(args.parser)
+    except ParserUnavailable as e:
+        raise SystemExit(str(e))
+
+    # The same options main.py converts with, so its outputs can serve as golden files
+    options = {'beautify': args.beautify, 'slice_source': args.slice_source, 'parser': args.parser,
+               'resolve_mixins': True, 'rewrite_template': True, 'mixin_aliases': {}}
+    run = RegressionRun(args.fixtures, args.golden, baseline=args.baseline, options=options, repeat=args.repeat,
+                        threshold=args.threshold, min_delta=args.min_delta / 1000, update=args.update)
+    passed = run.run()
+    run.report()
+    if args.budget_check:
+        failures = budget_failures(args.parser)
+        for failure in failures:
+            print(f"BUDGET: {failure}")
+        passed = passed and not failures
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+from types import GeneratorType
+
+# Binding strength of binary and logical operators, used to decide where an operand needs parentheses
+BINARY_PRECEDENCE = {
+    '??': 1,
+    '||': 2,
+    '&&': 3,
+    '|': 4,
+    '^': 5,
+    '&': 6,
+    '==': 7, '!=': 7, '===': 7, '!==': 7,
+    '<': 8, '>': 8, '<=': 8, '>=': 8, 'instanceof': 8, 'in': 8,
+    '<<': 9, '>>': 9, '>>>': 9,
+    '+': 10, '-': 10,
+    '*': 11, '/': 11, '%': 11,
+    '**': 12,
+}
+
+# Expressions that bind looser than any operator, so they are always wrapped when used as an operand
+LOOSE_EXPRESSIONS = {
+    'AssignmentExpression', 'ArrowFunctionExpression', 'ConditionalExpression', 'YieldExpression',
+    'SequenceExpression',
+}
+
+# Callees and member objects that need parentheses to keep their meaning, e.g. (a + b).c or (() => x)()
+NON_MEMBER_EXPRESSIONS = LOOSE_EXPRESSIONS | {
+    'BinaryExpression', 'LogicalExpression', 'UnaryExpression', 'UpdateExpression', 'AwaitExpression',
+    'FunctionExpression', 'ObjectExpression',
+    # (a?.b).c must not become a?.b.c, which would skip .c as well when a is nullish
+    'ChainExpression',
+}
+
+# The loose expressions that do not come out wrapped by themselves, as conditionals and sequences do. They need
+# parentheses as operands of logical operators, e.g. a || (b = c).
+UNWRAPPED_LOOSE_EXPRESSIONS = LOOSE_EXPRESSIONS - {'ConditionalExpression', 'SequenceExpression'}
+
+# Operands of unary operators and await that need parentheses, e.g. !(a = b) or await (a || b)
+NON_UNARY_EXPRESSIONS = UNWRAPPED_LOOSE_EXPRESSIONS | {'BinaryExpression', 'LogicalExpression'}
+
+WORD_OPERATORS = {'typeof', 'void', 'delete'}
+
+
+# Turns esprima nodes back into JavaScript source.
+#
+# Every node type maps to a handler in HANDLERS. Leaf handlers return the string directly; handlers for nodes with
+# children are generators that yield each child node and receive its string back. serialize() drives those
+# generators from an explicit stack, so every node costs a single dictionary lookup and no Python frame. The
+# serializer itself has no depth limit, but the parsers do and give up first: esprima raises RecursionError at about
+# 60 nested arrays or 160 nested blocks under Python's default recursion limit, acorn at several hundred levels. Code
+# nested deeper than that fails to parse and is reported as a failed conversion.
+class NodeSerializer:
+    HANDLERS = {
+        'FunctionExpression': '_function',
+        'ArrowFunctionExpression': '_function',
+        'FunctionDeclaration': '_function_declaration',
+        'BlockStatement': '_block',
+        'ReturnStatement': '_return',
+        'IfStatement': '_if',
+        'TryStatement': '_try',
+        'CatchClause': '_catch',
+        'ThrowStatement': '_throw',
+        'AwaitExpression': '_await',
+        'YieldExpression': '_yield',
+        'ExpressionStatement': '_expression_statement',
+        'EmptyStatement': '_empty',
+        'LabeledStatement': '_labeled',
+        'AssignmentExpression': '_assignment',
+        'AssignmentPattern': '_assignment_pattern',
+        'VariableDeclaration': '_variable_declaration',
+        'VariableDeclarator': '_variable_declarator',
+        'BinaryExpression': '_binary',
+        'LogicalExpression': '_logical',
+        'UnaryExpression': '_unary',
+        'UpdateExpression': '_update',
+        'SequenceExpression': '_sequence',
+        'ConditionalExpression': '_conditional',
+        'Literal': '_literal',
+        'Identifier': '_identifier',
+        'ThisExpression': '_this',
+        'Super': '_super',
+        'MemberExpression': '_member',
+        'ChainExpression': '_chain',
+        'CallExpression': '_call',
+        'NewExpression': '_new',
+        'ArrayExpression': '_array',
+        'ArrayPattern': '_array',
+        'ObjectExpression': '_object',
+        'ObjectPattern': '_object_pattern',
+        'Property': '_property',
+        'SpreadElement': '_spread',
+        'RestElement': '_spread',
+        'TemplateLiteral': '_template',
+        'TemplateElement': '_template_element',
+        'TaggedTemplateExpression': '_tagged_template',
+        'SwitchStatement': '_switch',
+        'SwitchCase': '_switch_case',
+        'BreakStatement': '_break',
+        'ContinueStatement': '_continue',
+        'ForStatement': '_for',
+        'ForInStatement': '_for_in',
+        'ForOfStatement': '_for_in',
+        'WhileStatement': '_while',
+        'DoWhileStatement': '_do_while',
+    }
+
+    # Node types without children, whose handlers return a string straight away
+    LEAVES = ('Identifier', 'Literal', 'ThisExpression', 'Super', 'TemplateElement', 'EmptyStatement')
+
+    def __init__(self):
+        self.handlers = {node_type: getattr(self, name) for node_type, name in self.HANDLERS.items()}
+        self.leaves = {node_type: self.handlers[node_type] for node_type in self.LEAVES}
+
+    def serialize(self, node):
+        handlers = self.handlers
+        leaves = self.leaves
+        stack = []
+        while True:
+            # Turn the current node into a string, or into a new frame when it has children to serialize first
+            if node is None:
+                value = "null"
+            else:
+                handler = handlers.get(node.type)
+                value = handler(node) if handler else f"/* Unsupported node type: {node.type} */"
+                if value.__class__ is GeneratorType:
+                    stack.append(value)
+                    value = None
+
+            # Hand the result to the waiting frame, unwinding every frame that finishes, until one asks for a child
+            # that has children of its own. Leaf children are answered in place without another trip round the loop.
+            while stack:
+                try:
+                    node = stack[-1].send(value)
+                except StopIteration as done:
+                    stack.pop()
+                    value = done.value
+                    continue
+                leaf = leaves.get(node.type) if node is not None else None
+                if leaf is None:
+                    break
+                value = leaf(node)
+            else:
+                return value
+
+    def _each(self, nodes):
+        strings = []
+        for node in nodes:
+            strings.append((yield node))
+        return strings
+
+    def _function(self, node):
+        async_prefix = "async " if node.isAsync else ""
+        params = ', '.join((yield from self._each(node.params)))
+        body = yield node.body
+        if node.body.type == 'ObjectExpression':
+            # An object literal body has to be wrapped, otherwise it is read as a block
+            body = f"({body})"
+        if len(node.params) == 1 and node.params[0].type == 'Identifier':
+            # Remove parentheses for single parameter
+            return f"{async_prefix}{params} => {body}"
+        return f"{async_prefix}({params}) => {body}"
+
+    def _function_declaration(self, node):
+        async_prefix = "async " if node.isAsync else ""
+        name = yield node.id
+        params = ', '.join((yield from self._each(node.params)))
+        body = yield node.body
+        return f"{async_prefix}function {name}({params}) {body}"
+
+    def _statements(self, nodes):
+        strings = []
+        for node in nodes:
+            strings.append(self._terminated(node, (yield node)))
+        return strings
+
+    @staticmethod
+    def _terminated(node, statement):
+        # Declarations are terminated where they stand as statements, since the one in a for head must not be; every
+        # other statement ends in ';' or '}' by itself
+        return f"{statement};" if node.type == 'VariableDeclaration' else statement
+
+    def _block(self, node):
+        statements = yield from self._statements(node.body)
+        return '{ ' + ' '.join(statements) + ' }'
+
+    def _return(self, node):
+        return f"return {(yield node.argument)};"
+
+    def _if(self, node):
+        condition = yield node.test
+        consequent = self._terminated(node.consequent, (yield node.consequent))
+        if node.alternate:
+            alternate = self._terminated(node.alternate, (yield node.alternate))
+            return f"if ({condition}) {consequent} else {alternate}"
+        return f"if ({condition}) {consequent}"
+
+    def _try(self, node):
+        try_block = yield node.block
+        catch_clause = f" {(yield node.handler)}" if node.handler else ""
+        finally_block = f" finally {(yield node.finalizer)}" if node.finalizer else ""
+        return f"try {try_block}{catch_clause}{finally_block}"
+
+    def _catch(self, node):
+        param = (yield node.param) if node.param else ""
+        body = yield node.body
+        return f"catch ({param}) {body}"
+
+    def _throw(self, node):
+        return f"throw {(yield node.argument)};"
+
+    def _await(self, node):
+        argument = yield node.argument
+        if node.argument.type in NON_UNARY_EXPRESSIONS:
+            argument = f"({argument})"
+        return f"await {argument}"
+
+    def _yield(self, node):
+        delegate = "*" if node.delegate else ""
+        if node.argument is None:
+            return f"yield{delegate}"
+        return f"yield{delegate} {(yield node.argument)}"
+
+    def _expression_statement(self, node):
+        expression = yield node.expression
+        if expression.startswith(('{', 'function', 'class')):
+            # Would be read as a block or a declaration, e.g. ({ a } = b);
+            expression = f"({expression})"
+        return f"{expression};"
+
+    def _empty(self, node):
+        return ";"
+
+    def _labeled(self, node):
+        label = yield node.label
+        body = self._terminated(node.body, (yield node.body))
+        return f"{label}: {body}"
+
+    def _assignment(self, node):
+        left = yield node.left
+        right = yield node.right
+        return f"{left} {node.operator} {right}"
+
+    def _assignment_pattern(self, node):
+        left = yield node.left
+        right = yield node.right
+        return f"{left} = {right}"
+
+    def _variable_declaration(self, node):
+        declarations = yield from self._each(node.declarations)
+        return f"{node.kind} {', '.join(declarations)}"
+
+    def _variable_declarator(self, node):
+        id_str = yield node.id
+        if node.init is None:
+            return id_str
+        return f"{id_str} = {(yield node.init)}"
+
+    def _operand(self, node, precedence, right=False):
+        operand = yield node
+        if node.type in LOOSE_EXPRESSIONS and node.type != 'ConditionalExpression':
+            return f"({operand})"
+        if node.type in ('BinaryExpression', 'LogicalExpression'):
+            operand_precedence = BINARY_PRECEDENCE[node.operator]
+            if operand_precedence < precedence or (right and operand_precedence == precedence):
+                return f"({operand})"
+        return operand
+
+    def _binary(self, node):
+        precedence = BINARY_PRECEDENCE[node.operator]
+        left = yield from self._operand(node.left, precedence)
+        right = yield from self._operand(node.right, precedence, right=True)
+        if node.operator == '**' and node.left.type in ('UnaryExpression', 'AwaitExpression'):
+            # -a ** b is a syntax error, the base has to be wrapped
+            left = f"({left})"
+        return f"{left} {node.operator} {right}"
+
+    def _logical(self, node):
+        left = yield node.left
+        right = yield node.right
+        if (node.left.type == 'LogicalExpression' and node.left.operator != node.operator
+                or node.left.type in UNWRAPPED_LOOSE_EXPRESSIONS):
+            left = f"({left})"
+        if (node.right.type == 'LogicalExpression' and node.right.operator != node.operator
+                or node.right.type in UNWRAPPED_LOOSE_EXPRESSIONS):
+            right = f"({right})"
+        return f"{left} {node.operator} {right}"
+
+    def _unary(self, node):
+        argument = yield node.argument
+        if node.argument.type in NON_UNARY_EXPRESSIONS:
+            argument = f"({argument})"
+        if node.operator in WORD_OPERATORS or (node.operator in '+-' and argument.startswith(node.operator)):
+            # typeof x, and - -x rather than the decrement --x
+            return f"{node.operator} {argument}"
+        return f"{node.operator}{argument}"
+
+    def _update(self, node):
+        argument = yield node.argument
+        if node.prefix:
+            return f"{node.operator}{argument}"
+        return f"{argument}{node.operator}"
+
+    def _sequence(self, node):
+        expressions = yield from self._each(node.expressions)
+        return f"({', '.join(expressions)})"
+
+    def _conditional(self, node):
+        test = yield node.test
+        consequent = yield node.consequent
+        alternate = yield node.alternate
+        return f"({test} ? {consequent} : {alternate})"
+
+    def _literal(self, node):
+        if node.value is None and not getattr(node, 'regex', None):
+            return "null"  # Explicitly handle null literals
+        elif isinstance(node.value, bool):
+            return str(node.value).lower()
+        elif isinstance(node.value, str):
+            return repr(node.value)
+        # Numbers and regular expressions are copied as written, so 0xff stays hex and /a\/b/g keeps its flags
+        return node.raw
+
+    def _identifier(self, node):
+        return node.name
+
+    def _this(self, node):
+        return 'this'
+
+    def _super(self, node):
+        return 'super'
+
+    def _member(self, node):
+        # Plain chains such as this.user.name are joined in place, without a frame per link
+        names = []
+        while node.type == 'MemberExpression' and not node.computed:
+            names.append(node.property.name)
+            node = node.object
+        if node.type == 'Identifier':
+            return '.'.join([node.name, *reversed(names)])
+        if node.type == 'ThisExpression':
+            return '.'.join(['this', *reversed(names)])
+        return self._member_frame(node, names)
+
+    def _member_frame(self, node, names):
+        suffix = ''.join(f".{name}" for name in reversed(names))
+        if node.type != 'MemberExpression':
+            obj = yield node
+            if self._wrapped_object(node):
+                obj = f"({obj})"
+            return f"{obj}{suffix}"
+        obj = yield node.object
+        if self._wrapped_object(node.object):
+            obj = f"({obj})"
+        return f"{obj}[{(yield node.property)}]{suffix}"
+
+    @staticmethod
+    def _wrapped_object(node):
+        # Member objects that need parentheses: (a + b).c, and (1).toString() where 1.toString() would be read as a
+        # malformed number
+        if node.type == 'Literal':
+            return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+        return node.type in NON_MEMBER_EXPRESSIONS
+
+    def _chain(self, node):
+        # Optional links (a?.b, a?.[b], a?.()) only occur inside a ChainExpression, so only this path checks for them
+        links = []
+        node = node.expression
+        while node.type in ('MemberExpression', 'CallExpression'):
+            links.append(node)
+            node = node.object if node.type == 'MemberExpression' else node.callee
+        code = yield node
+        if self._wrapped_object(node):
+            code = f"({code})"
+        for link in reversed(links):
+            dot = '?.' if link.optional else ''
+            if link.type == 'CallExpression':
+                args = yield from self._each(link.arguments)
+                code = f"{code}{dot}({', '.join(args)})"
+            elif link.computed:
+                code = f"{code}{dot}[{(yield link.property)}]"
+            else:
+                code = f"{code}{dot or '.'}{link.property.name}"
+        return code
+
+    def _call(self, node):
+        callee = yield node.callee
+        if node.callee.type in NON_MEMBER_EXPRESSIONS:
+            callee = f"({callee})"
+        args = yield from self._each(node.arguments)
+        return f"{callee}({', '.join(args)})"
+
+    def _new(self, node):
+        callee = yield node.callee
+        if node.callee.type in NON_MEMBER_EXPRESSIONS or self._contains_call(node.callee):
+            # new (foo())() constructs what foo returns, new foo()() would call what new foo() builds
+            callee = f"({callee})"
+        args = yield from self._each(node.arguments)
+        return f"new {callee}({', '.join(args)})"
+
+    @staticmethod
+    def _contains_call(node):
+        while node.type == 'MemberExpression':
+            node = node.object
+        return node.type in ('CallExpression', 'ChainExpression')
+
+    def _array(self, node):
+        elements = []
+        for element in node.elements:
+            # Holes in [a, , b] stay empty instead of turning into null
+            elements.append((yield element) if element is not None else "")
+        return f"[{', '.join(elements)}]"
+
+    def _key(self, node):
+        if node.computed:
+            return f"[{(yield node.key)}]"
+        if node.key.type == 'Identifier':
+            return node.key.name
+        return (yield node.key)
+
+    def _object(self, node):
+        properties = []
+        for p in node.properties:
+            if p.type == 'SpreadElement':
+                properties.append(f"...{(yield p.argument)}")
+            elif p.kind in ('get', 'set'):
+                key = yield from self._key(p)
+                params = ', '.join((yield from self._each(p.value.params)))
+                properties.append(f"{p.kind} {key}({params}) {(yield p.value.body)}")
+            else:
+                key = yield from self._key(p)
+                properties.append(f"{key}: {(yield p.value)}")
+        return f"{{{', '.join(properties)}}}"
+
+    def _object_pattern(self, node):
+        properties = yield from self._each(node.properties)
+        return f"{{ {', '.join(properties)} }}"
+
+    def _property(self, node):
+        if node.shorthand:
+            if node.value.type == 'AssignmentPattern':
+                # { size = 10 } keeps its default value
+                return (yield node.value)
+            return node.key.name
+        key = yield from self._key(node)
+        value = yield node.value
+        return f"{key}: {value}"
+
+    def _spread(self, node):
+        return f"...{(yield node.argument)}"
+
+    def _template(self, node):
+        parts = []
+        expressions = node.expressions
+        for i, quasi in enumerate(node.quasis):
+            parts.append((yield quasi))
+            if i < len(expressions):
+                parts.append(f"${{{(yield expressions[i])}}}")
+        return f"`{''.join(parts)}`"
+
+    def _template_element(self, node):
+        # The raw text keeps escapes such as \n and \` intact
+        return node.value.raw
+
+    def _tagged_template(self, node):
+        tag = yield node.tag
+        quasi = yield node.quasi
+        return f"{tag}{quasi}"
+
+    def _switch(self, node):
+        discriminant = yield node.discriminant
+        cases = yield from self._each(node.cases)
+        return f"switch ({discriminant}) {{{' '.join(cases)}}}"
+
+    def _switch_case(self, node):
+        consequent = ' '.join((yield from self._statements(node.consequent)))
+        if node.test:
+            return f"case {(yield node.test)}: {consequent}"
+        return f"default: {consequent}"
+
+    def _break(self, node):
+        if node.label:
+            return f"break {(yield node.label)};"
+        return "break;"
+
+    def _continue(self, node):
+        if node.label:
+            return f"continue {(yield node.label)};"
+        return "continue;"
+
+    def _for(self, node):
+        init = (yield node.init) if node.init else ""
+        test = (yield node.test) if node.test else ""
+        update = (yield node.update) if node.update else ""
+        body = self._terminated(node.body, (yield node.body))
+        return f"for ({init}; {test}; {update}) {body}"
+
+    def _for_in(self, node):
+        left = yield node.left
+        right = yield node.right
+        body = self._terminated(node.body, (yield node.body))
+        keyword = 'in' if node.type == 'ForInStatement' else 'of'
+        return f"for ({left} {keyword} {right}) {body}"
+
+    def _while(self, node):
+        test = yield node.test
+        body = self._terminated(node.body, (yield node.body))
+        return f"while ({test}) {body}"
+
+    def _do_while(self, node):
+        body = self._terminated(node.body, (yield node.body))
+        test = yield node.test
+        return f"do {body} while ({test});"
+
+
+# Copies nodes from the original script instead of rebuilding them, keeping formatting, comments and any syntax the
+# serializer does not know. Needs an AST parsed with range information. Functions still come out in the arrow form
+# the generator expects, but with their parameters and body copied verbatim.
+class SourceSlicer:
+    def __init__(self, source):
+        self.source = source
+
+    def serialize(self, node):
+        if node is None:
+            return "null"
+        if node.type not in ('FunctionExpression', 'ArrowFunctionExpression'):
+            return self.slice(node)
+
+        async_prefix = "async " if node.isAsync else ""
+        params = self.source[node.params[0].range[0]:node.params[-1].range[1]] if node.params else ""
+        body = self.slice(node.body)
+        if node.body.type == 'ObjectExpression':
+            body = f"({body})"
+        return f"{async_prefix}({params}) => {body}"
+
+    def slice(self, node):
+        start, end = node.range
+        return self.source[start:end]
@@ -0,0 +1,240 @@
+import inspect
+import json
+import logging
+import os
+import selectors
+import socket
+import stat
+import time
+
+from analyzer import analyze_content
+from batch import _WarningCollector
+from main import convert_sfc, read_file, warm_up, write_file
+
+logger = logging.getLogger(__name__)
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+# Keeps the converter loaded in one process and answers JSON-RPC 2.0 requests, one JSON object per line, from stdin or
+# a Unix socket. Requests are handled one at a time in the main thread, which is where time budgets work.
+#
+#   -> {"jsonrpc": "2.0", "id": 1, "method": "convert", "params": {"content": "<template>...", "path": "src/A.vue"}}
+#   <- {"jsonrpc": "2.0", "id": 1, "result": {"status": "converted", "output": "...", "message": null,
+#                                             "warnings": [], "seconds": 0.004}}
+class ConversionServer:
+    def __init__(self, options=None, cache=None, budget=None):
+        self.options = options or {}
+        self.cache = cache
+        self.budget = budget
+        self.running = False
+        self.requests = 0
+        self.methods = {
+            'convert': self.convert,
+            'convertFile': self.convert_file,
+            'analyze': self.analyze,
+            'ping': self.ping,
+            'shutdown': self.shutdown,
+        }
+
+    def warm_up(self):
+        start = time.perf_counter()
+        warm_up(self.options)
+        logger.debug("Warmed up in %.1fms", (time.perf_counter() - start) * 1000)
+
+    def convert(self, content, path=None, options=None):
+        # path only locates relative mixin imports; nothing is read or written
+        start = time.perf_counter()
+        with _Warnings() as warnings:
+            status, output, message = convert_sfc(content, options=self._options(options), cache=self.cache,
+                                                  path=path, budget=self.budget)
+        return {'status': status, 'output': output, 'message': message, 'warnings': warnings.messages,
+                'seconds': round(time.perf_counter() - start, 6)}
+
+    def convert_file(self, path, output=None, options=None):
+        # Converts a file on disk; with output set the result is written there and left out of the response
+        try:
+            content = read_file(path)
+        except OSError as e:
+            raise RpcError(INVALID_PARAMS, f"Cannot read {path}: {e}") from e
+        result = self.convert(content, path=path, options=options)
+        if output is not None:
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            write_file(output, result.pop('output'))
+        return result
+
+    def analyze(self, content, options=None):
+        with _Warnings() as warnings:
+            record = analyze_content(content, self._options(options))
+        record['warnings'] = warnings.messages
+        return record
+
+    def ping(self):
+        return {'requests': self.requests, 'pid': os.getpid()}
+
+    def shutdown(self):
+        self.running = False
+        return None
+
+    def _options(self, options):
+        # Per-request options are laid over the ones the server was started with
+        return {**self.options, **options} if options else self.options
+
+    def handle_bytes(self, line):
+        # A request line as received from a socket; bytes that are not UTF-8 cannot be JSON
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError as e:
+            return json.dumps(_error(None, PARSE_ERROR, f"Invalid UTF-8: {e}"))
+        return self.handle_line(text)
+
+    def handle_line(self, line):
+        # The response line for one request line, or None for notifications and blank lines
+        if not line.strip():
+            return None
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return json.dumps(_error(None, PARSE_ERROR, f"Invalid JSON: {e}"))
+        if isinstance(request, list):
+            # A batch: answered with one array, without the notifications
+            responses = [response for response in map(self.dispatch, request) if response is not None]
+            return json.dumps(responses) if responses else None
+        response = self.dispatch(request)
+        return json.dumps(response) if response is not None else None
+
+    def dispatch(self, request):
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or 'method' not in request:
+            return _error(request.get('id') if isinstance(request, dict) else None, INVALID_REQUEST,
+                          "Not a JSON-RPC 2.0 request")
+        request_id = request.get('id')
+        self.requests += 1
+        try:
+            method = self.methods.get(request['method'])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"Unknown method {request['method']!r}")
+            params = request.get('params') or {}
+            args, kwargs = (params, {}) if isinstance(params, list) else ((), params)
+            try:
+                inspect.signature(method).bind(*args, **kwargs)
+            except TypeError as e:
+                raise RpcError(INVALID_PARAMS, str(e)) from e
+            result = method(*args, **kwargs)
+        except RpcError as e:
+            response = _error(request_id, e.code, str(e))
+        except Exception as e:
+            logger.exception("Request %s failed", request_id)
+            response = _error(request_id, INTERNAL_ERROR, str(e))
+        else:
+            response = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        # Requests without an id are notifications and get no response
+        return response if 'id' in request else None
+
+    def serve_stdio(self, stdin, stdout):
+        self.running = True
+        logger.info("Serving JSON-RPC on stdin")
+        # Read as bytes where possible, so a line that is not UTF-8 gets an error response instead of ending the server
+        for line in getattr(stdin, 'buffer', stdin):
+            response = self.handle_bytes(line) if isinstance(line, bytes) else self.handle_line(line)
+            if response is not None:
+                stdout.write(response + '\n')
+                stdout.flush()
+            if not self.running:
+                break
+
+    def serve_socket(self, path):
+        _remove_stale_socket(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the user running the server may connect. The socket is created with these permissions, a chmod after
+        # bind() would leave a moment in which anyone could.
+        umask = os.umask(0o177)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        server.listen()
+        selector = selectors.DefaultSelector()
+        selector.register(server, selectors.EVENT_READ)
+        buffers = {}
+        self.running = True
+        logger.info("Serving JSON-RPC on %s", path)
+        try:
+            while self.running:
+                for key, _ in selector.select():
+                    if key.fileobj is server:
+                        connection, _ = server.accept()
+                        selector.register(connection, selectors.EVENT_READ)
+                        buffers[connection] = b''
+                        continue
+                    connection = key.fileobj
+                    try:
+                        data = connection.recv(65536)
+                        if data:
+                            buffers[connection] += data
+                            while b'\n' in buffers[connection]:
+                                line, _, buffers[connection] = buffers[connection].partition(b'\n')
+                                response = self.handle_bytes(line)
+                                if response is not None:
+                                    connection.sendall(response.encode('utf-8') + b'\n')
+                            continue
+                    except OSError as e:
+                        # A client that resets the connection or goes away before its reply is sent only loses its
+                        # own connection
+                        logger.debug("Connection dropped: %s", e)
+                    # Closed by the client, or failed
+                    selector.unregister(connection)
+                    connection.close()
+                    del buffers[connection]
+        finally:
+            for connection in buffers:
+                connection.close()
+            selector.close()
+            server.close()
+            os.unlink(path)
+
+
+def _remove_stale_socket(path):
+    # Removes a socket left behind by a server that did not shut down cleanly. Anything else at the path, a regular
+    # file from a mistyped --socket or the socket of a server that still answers, is left alone.
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} already exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise FileExistsError(f"Another server is already listening on {path}")
+
+
+# Collects the warnings logged while a request is handled, for its response
+class _Warnings:
+    def __enter__(self):
+        self.collector = _WarningCollector()
+        logging.getLogger().addHandler(self.collector)
+        return self.collector
+
+    def __exit__(self, *exc_info):
+        logging.getLogger().removeHandler(self.collector)
+        return False
+
+
+def _error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
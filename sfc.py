@@ -0,0 +1,128 @@
+import re
+
+# Opening tag of a top-level block, matched at a known position; attribute values may contain '>' inside quotes
+OPEN_TAG_RE = re.compile(r'''<([A-Za-z][\w-]*)((?:\s+[^\s=/>]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+))?)*)\s*(/?)>''')
+ATTRIBUTE_RE = re.compile(r'''([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+# Nested <template> tags inside the top-level template, used to find the matching close tag
+TEMPLATE_TAG_RE = re.compile(r'<(/?)template\b[^>]*?(/?)>')
+
+
+# One top-level block of a single-file component. All offsets index into the original source, so callers slice the
+# source instead of holding copies: [start, end) spans the whole block including its tags, and
+# [content_start, content_end) the text between them.
+class SFCBlock:
+    __slots__ = ('source', 'type', 'attrs', 'start', 'end', 'content_start', 'content_end')
+
+    def __init__(self, source, type, attrs, start, end, content_start, content_end):
+        self.source = source
+        self.type = type
+        self.attrs = attrs
+        self.start = start
+        self.end = end
+        self.content_start = content_start
+        self.content_end = content_end
+
+    @property
+    def content(self):
+        return self.source[self.content_start:self.content_end]
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    @property
+    def open_tag(self):
+        return self.source[self.start:self.content_start]
+
+    def __repr__(self):
+        return f"SFCBlock({self.type!r}, {self.attrs!r}, {self.start}, {self.end})"
+
+
+def parse_attributes(text):
+    attrs = {}
+    for match in ATTRIBUTE_RE.finditer(text):
+        name, double, single, bare = match.groups()
+        value = double if double is not None else single if single is not None else bare
+        # Boolean attributes such as <script setup> or <style scoped> are stored as True
+        attrs[name] = True if value is None else value
+    return attrs
+
+
+def _find_template_end(source, pos):
+    depth = 1
+    for match in TEMPLATE_TAG_RE.finditer(source, pos):
+        if match.group(2):
+            continue
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return match.start(), match.end()
+    return -1, -1
+
+
+def split_sfc(source):
+    # Walk the top level once: every block is located with str.find or an anchored match, never by re-scanning
+    blocks = []
+    pos = 0
+    length = len(source)
+    while pos < length:
+        pos = source.find('<', pos)
+        if pos == -1:
+            break
+
+        if source.startswith('<!--', pos):
+            comment_end = source.find('-->', pos + 4)
+            pos = length if comment_end == -1 else comment_end + 3
+            continue
+
+        match = OPEN_TAG_RE.match(source, pos)
+        if not match:
+            pos += 1
+            continue
+
+        tag = match.group(1).lower()
+        attrs = parse_attributes(match.group(2))
+        if match.group(3):
+            # A self-closing block has no content
+            blocks.append(SFCBlock(source, tag, attrs, pos, match.end(), match.end(), match.end()))
+            pos = match.end()
+            continue
+
+        content_start = match.end()
+        if tag == 'template':
+            content_end, end = _find_template_end(source, content_start)
+        else:
+            # Script, style and custom blocks hold raw text, so the first closing tag ends them
+            content_end = source.find(f'</{match.group(1)}', content_start)
+            end = source.find('>', content_end) + 1 if content_end != -1 else -1
+
+        if content_end == -1 or end == 0:
+            # Unterminated block, it runs to the end of the file
+            content_end = end = length
+
+        blocks.append(SFCBlock(source, tag, attrs, pos, end, content_start, content_end))
+        pos = end
+    return blocks
+
+
+def find_block(blocks, block_type):
+    return next((block for block in blocks if block.type == block_type), None)
+
+
+def find_script_block(blocks):
+    # <script setup> is already Composition API, only a plain <script> holds Options API code to migrate
+    for block in blocks:
+        if block.type == 'script' and not block.attrs.get('setup'):
+            return block
+    return None
+
+
+def replace_spans(source, replacements):
+    # Splice several (start, end, text) replacements into the source in one pass
+    parts = []
+    position = 0
+    for start, end, text in sorted(replacements):
+        parts.append(source[position:start])
+        parts.append(text)
+        position = end
+    parts.append(source[position:])
+    return ''.join(parts)
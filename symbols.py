@@ -0,0 +1,58 @@
+import re
+from collections import Counter
+
+import profiling
+
+# Every this.name and this.$name in setup code; members are looked up by name, so their number does not add scans
+THIS_RE = re.compile(r'\bthis\.([\w$]+)')
+
+# What this.name becomes inside setup(), by the kind of member it names. The first kind with the name wins: a prop
+# shadows data of the same name, and the component's own members shadow the ones inherited from mixins, which stay
+# in the mixins option and so live on the instance.
+KINDS = (
+    ('props', 'props.{}'),
+    ('data', '{}.value'),
+    ('methods', '{}'),
+    ('computed', '{}.value'),
+    ('mixin_members', 'instance.proxy.{}'),
+)
+
+
+# The members of one scanned component, built once and applied to setup code in a single pass. this.$name goes to
+# the instance API rules, and the references of each kind are counted on the way, which is what decides whether
+# setup() takes props and needs the instance.
+class SymbolTable:
+    def __init__(self, component, apis):
+        self.apis = apis
+        self.symbols = {}
+        for kind, replacement in KINDS:
+            for name in getattr(component, kind):
+                if name not in self.symbols:
+                    self.symbols[name] = (replacement.format(name), kind)
+        self.references = Counter()
+
+    def rewrite(self, code):
+        if 'this.' not in code:
+            return code
+        with profiling.phase('fix_this'):
+            return THIS_RE.sub(self._replace, code)
+
+    def _replace(self, match):
+        name = match.group(1)
+        if name[0] == '$':
+            return self.apis.use(name[1:]).replacement if len(name) > 1 else match.group(0)
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            # Not declared by the component or its mixins, left as it is
+            return match.group(0)
+        replacement, kind = symbol
+        self.references[kind] += 1
+        return replacement
+
+    @property
+    def uses_props(self):
+        return self.references['props'] > 0
+
+    @property
+    def uses_instance(self):
+        return self.references['mixin_members'] > 0
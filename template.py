@@ -0,0 +1,231 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Comments, end tags, and start tags split into name, attributes and the closing '>' or '/>'. Anything else is text.
+TOKEN_RE = re.compile(r'''<!--.*?(?:-->|\Z)|</([A-Za-z][\w.:-]*)\s*>|'''
+                      r'''<([A-Za-z][\w.:-]*)((?:\s+[^\s=/>]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+))?)*)(\s*/?)>''', re.S)
+# One attribute with the whitespace before it, so untouched attributes are copied exactly as written
+ATTRIBUTE_RE = re.compile(r'''(\s+)([^\s=/>]+)(?:(\s*=\s*)("[^"]*"|'[^']*'|[^\s>]+))?''')
+SYNC_RE = re.compile(r'(?::|v-bind:)([\w-]+|\[[^\]]+\])\.sync')
+# Attributes that may need rewriting; tags without any of these are copied without parsing their attributes
+TRIGGERS = ('.sync', '$listeners', 'v-for', '|')
+TRIGGER_RE = re.compile('|'.join(re.escape(trigger) for trigger in TRIGGERS))
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+
+FILTER_BINDINGS = (':', 'v-bind:')
+
+
+def rewrite_filters(expression):
+    # a | f | g(1) -> g(f(a), 1). A filter pipe is a single '|' outside strings and brackets; '||' is left alone.
+    if '|' not in expression:
+        return expression
+    pipes = []
+    quote = None
+    depth = 0
+    index = 0
+    length = len(expression)
+    while index < length:
+        char = expression[index]
+        if quote:
+            if char == '\\':
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'`':
+            quote = char
+        elif char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            if expression[index + 1:index + 2] == '|':
+                index += 1
+            else:
+                pipes.append(index)
+        index += 1
+    if not pipes:
+        return expression
+
+    bounds = [-1, *pipes, length]
+    result = expression[:pipes[0]].strip()
+    for start, end in zip(bounds[1:-1], bounds[2:]):
+        name, paren, args = expression[start + 1:end].strip().partition('(')
+        args = args.rstrip()[:-1].strip() if paren else ''
+        result = f"{name.strip()}({result}, {args})" if args else f"{name.strip()}({result})"
+    return result
+
+
+def _rewrite_interpolations(text):
+    parts = []
+    position = 0
+    while True:
+        start = text.find('{{', position)
+        if start == -1:
+            break
+        end = text.find('}}', start + 2)
+        if end == -1:
+            break
+        inner = text[start + 2:end]
+        rewritten = rewrite_filters(inner)
+        if rewritten is not inner:
+            # Keep the spacing inside the braces, e.g. {{ a | f }} -> {{ f(a) }}
+            leading = inner[:len(inner) - len(inner.lstrip())]
+            trailing = inner[len(inner.rstrip()):]
+            inner = f"{leading}{rewritten}{trailing}"
+        parts.append(text[position:start + 2])
+        parts.append(inner)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def _unquote(value):
+    if value and value[0] in '"\'' and value[-1] == value[0]:
+        return value[0], value[1:-1]
+    return '', value
+
+
+# Rewrites a Vue2 template for the Vue3 breaking changes that can be fixed mechanically, in one pass over the text:
+#   :title.sync="x"              -> v-model:title="x"
+#   {{ a | f(1) }}, :x="a | f"   -> {{ f(a, 1) }}, :x="f(a)" (filters were removed)
+#   v-on="$listeners"            -> v-bind="$attrs", or dropped when $attrs is bound already
+#   <li v-for="..." v-if="...">  -> <template v-for="..."><li v-if="...">...</li></template>, since v-if now runs
+#                                   before v-for and could no longer see the loop variable
+# Everything else, including the layout of untouched tags, is copied unchanged.
+class TemplateRewriter:
+    def __init__(self, source):
+        self.source = source
+        self.parts = []
+        self.changes = 0
+        # Open elements per tag name, and (name, depth) of each element wrapped in <template v-for> whose end tag
+        # must be followed by </template>
+        self.open = {}
+        self.wrapped = []
+
+    def rewrite(self):
+        # One pass over the template with a single tokenizing regex; text between tokens is copied in slices
+        source = self.source
+        parts = self.parts
+        copied = 0
+        for match in TOKEN_RE.finditer(source):
+            start = match.start()
+            if start > copied:
+                self._text(source[copied:start])
+            copied = match.end()
+            if match.group(1) is not None:
+                parts.append(match.group(0))
+                self._closed(match.group(1))
+            elif match.group(2) is not None:
+                self._start_tag(match)
+            else:
+                # Comments are kept as they are, including any {{ }} inside them
+                parts.append(match.group(0))
+        self._text(source[copied:])
+        return ''.join(parts)
+
+    def _text(self, text):
+        if '{{' in text and '|' in text:
+            rewritten = _rewrite_interpolations(text)
+            if rewritten != text:
+                self.changes += 1
+                text = rewritten
+        self.parts.append(text)
+
+    def _closed(self, name):
+        depth = self.open.get(name, 0)
+        if self.wrapped and self.wrapped[-1] == (name, depth):
+            self.wrapped.pop()
+            self.parts.append('</template>')
+        if depth:
+            self.open[name] = depth - 1
+
+    def _start_tag(self, match):
+        _, name, attributes, close = match.groups()
+        self_closing = close.strip() == '/' or name.lower() in VOID_ELEMENTS
+
+        if not TRIGGER_RE.search(attributes):
+            self.parts.append(match.group(0))
+            if not self_closing:
+                self.open[name] = self.open.get(name, 0) + 1
+            return
+
+        attrs = [list(attr.groups()) for attr in ATTRIBUTE_RE.finditer(attributes)]
+        changed = self._rewrite_attributes(attrs)
+        loop = self._unwrap_loop(attrs)
+
+        if loop is not None:
+            self.parts.append(f"<template{''.join(_attribute(attr) for attr in loop)}>")
+        if changed or loop is not None:
+            self.changes += 1
+            self.parts.append(f"<{name}{''.join(_attribute(attr) for attr in attrs)}{close}>")
+        else:
+            self.parts.append(match.group(0))
+
+        if self_closing:
+            if loop is not None:
+                self.parts.append('</template>')
+            return
+        depth = self.open.get(name, 0) + 1
+        self.open[name] = depth
+        if loop is not None:
+            self.wrapped.append((name, depth))
+
+    def _rewrite_attributes(self, attrs):
+        changed = False
+        for attr in list(attrs):
+            _, attr_name, _, value = attr
+            sync = SYNC_RE.fullmatch(attr_name)
+            if sync:
+                attr[1] = f"v-model:{sync.group(1)}"
+                changed = True
+            elif attr_name == 'v-bind.sync':
+                logger.warning("v-bind.sync=%s has no Vue3 equivalent, bind each property with v-model:prop", value)
+
+            if value is None:
+                continue
+            quote, expression = _unquote(value)
+            if attr_name.startswith(FILTER_BINDINGS) and '|' in expression:
+                rewritten = rewrite_filters(expression)
+                if rewritten is not expression:
+                    attr[3] = f"{quote}{rewritten}{quote}"
+                    changed = True
+            if attr_name in ('v-on', '@') and expression.strip() == '$listeners':
+                # Listeners are part of $attrs in Vue3
+                if any(_unquote(other[3] or '')[1].strip() == '$attrs' for other in attrs if other[1] == 'v-bind'):
+                    attrs.remove(attr)
+                else:
+                    attr[1], attr[3] = 'v-bind', '"$attrs"'
+                changed = True
+            elif '$listeners' in expression:
+                logger.warning("%s=%s uses $listeners, which was merged into $attrs in Vue3", attr_name, value)
+        return changed
+
+    def _unwrap_loop(self, attrs):
+        # v-for and the key move to a wrapping <template> when the element also has v-if
+        names = [attr[1] for attr in attrs]
+        if 'v-for' not in names or 'v-if' not in names:
+            return None
+        loop = [attr for attr in attrs if attr[1] in ('v-for', ':key', 'v-bind:key')]
+        for attr in loop:
+            attrs.remove(attr)
+        return loop
+
+
+def _attribute(attr):
+    space, name, equals, value = attr
+    return f"{space}{name}{equals}{value}" if value is not None else f"{space}{name}"
+
+
+def rewrite_template(source):
+    if not TRIGGER_RE.search(source):
+        return source
+    rewriter = TemplateRewriter(source)
+    output = rewriter.rewrite()
+    logger.debug("Rewrote %d template nodes", rewriter.changes)
+    return output if rewriter.changes else source
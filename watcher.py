@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import time
+
+from discovery import find_components
+from main import convert_sfc, read_file, warm_up, write_file
+
+logger = logging.getLogger(__name__)
+
+
+class ComponentWatcher:
+    def __init__(self, src_root, dst_root, interval=0.2, debounce=0.3, cache=None, options=None, include=None,
+                 exclude=None, budget=None):
+        self.src_root = src_root
+        self.budget = budget
+        self.include = include
+        self.exclude = exclude
+        self.dst_root = dst_root
+        self.interval = interval
+        self.debounce = debounce
+        self.cache = cache
+        self.options = options
+        # path -> (mtime_ns, size) from the last poll, and path -> hash of the last converted content
+        self.stats = {}
+        self.hashes = {}
+        # path -> time of the most recent change that has not been converted yet
+        self.pending = {}
+
+    def _sources(self):
+        if not os.path.isdir(self.src_root):
+            return [self.src_root]
+        # An output directory inside the watched tree is left out, or every poll would convert the outputs just
+        # written again, into ever deeper copies. Compared by real path, so symlinks and '..' cannot sneak it in.
+        output_root = os.path.realpath(self.dst_root)
+        inside = {}
+        sources = []
+        for src_path in find_components(self.src_root, self.include, self.exclude):
+            directory = os.path.dirname(src_path)
+            if directory not in inside:
+                real = os.path.realpath(directory)
+                inside[directory] = real == output_root or real.startswith(output_root + os.sep)
+            if not inside[directory]:
+                sources.append(src_path)
+        return sources
+
+    def _output_path(self, src_path):
+        if not os.path.isdir(self.src_root):
+            return self.dst_root
+        return os.path.join(self.dst_root, os.path.relpath(src_path, self.src_root))
+
+    def poll(self):
+        now = time.monotonic()
+        seen = set()
+        for src_path in self._sources():
+            seen.add(src_path)
+            try:
+                stat = os.stat(src_path)
+            except OSError:
+                # Deleted since the listing, or not accessible
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self.stats.get(src_path) != signature:
+                self.stats[src_path] = signature
+                self.pending[src_path] = now
+
+        for src_path in set(self.stats) - seen:
+            # Deleted files are forgotten, their last output is left in place
+            del self.stats[src_path]
+            self.hashes.pop(src_path, None)
+            self.pending.pop(src_path, None)
+
+    def flush(self):
+        # Only convert files that have been quiet for the debounce window, so a burst of saves converts once
+        now = time.monotonic()
+        ready = [path for path, changed_at in self.pending.items() if now - changed_at >= self.debounce]
+        converted = []
+        for src_path in ready:
+            del self.pending[src_path]
+            if self._convert(src_path):
+                converted.append(src_path)
+        return converted
+
+    def _convert(self, src_path):
+        try:
+            content = read_file(src_path)
+        except FileNotFoundError:
+            return False
+        except (OSError, UnicodeError) as e:
+            # e.g. a file that is not UTF-8: reported, and read again once it changes
+            logger.error("FAILED: %s: Cannot read %s: %s", src_path, src_path, e)
+            self.hashes.pop(src_path, None)
+            return False
+
+        # Saving without edits, or touching the file, changes the mtime but not the content
+        content_hash = hashlib.sha1(content.encode()).hexdigest()
+        dst_path = self._output_path(src_path)
+        if self.hashes.get(src_path) == content_hash and os.path.exists(dst_path):
+            return False
+        self.hashes[src_path] = content_hash
+
+        start = time.perf_counter()
+        status, output, error = convert_sfc(content, options=self.options, cache=self.cache, path=src_path,
+                                            budget=self.budget)
+        try:
+            os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+            write_file(dst_path, output)
+        except (OSError, UnicodeError) as e:
+            status, error = 'failed', f"Cannot write {dst_path}: {e}"
+
+        elapsed = (time.perf_counter() - start) * 1000
+        if status == 'failed':
+            # Converted again on the next change, even one that leaves the content as it is
+            self.hashes.pop(src_path, None)
+            logger.error("FAILED: %s: %s", src_path, error)
+        elif status == 'skipped':
+            logger.info("Skipped %s -> %s: %s", src_path, dst_path, error)
+        else:
+            logger.info("%s %s -> %s in %.1fms", status.capitalize(), src_path, dst_path, elapsed)
+        return True
+
+    def prime(self):
+        # Record the current state of the tree; files whose output is newer than the file itself are not converted
+        # again, the others are converted on the first flush
+        self.poll()
+        for src_path in list(self.pending):
+            try:
+                up_to_date = os.stat(self._output_path(src_path)).st_mtime_ns >= self.stats[src_path][0]
+                content = read_file(src_path) if up_to_date else None
+            except (OSError, UnicodeError):
+                # No output yet, or a file that cannot be read: left pending, the first flush converts or reports it
+                continue
+            if up_to_date:
+                del self.pending[src_path]
+                self.hashes[src_path] = hashlib.sha1(content.encode()).hexdigest()
+
+    def run(self):
+        if self.budget:
+            # Loads the parser backend and the converter before the first budgeted file
+            warm_up(self.options or {})
+        self.prime()
+        logger.info("Watching %s for changes (Ctrl+C to stop)", self.src_root)
+        try:
+            while True:
+                self.poll()
+                self.flush()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")